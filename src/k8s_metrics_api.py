@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+
+import calendar
+import http.client
+import json
+import os
+import ssl
+import threading
+import time
+from urllib.parse import urlencode
+
+SERVICE_ACCOUNT_DIR = "/var/run/secrets/kubernetes.io/serviceaccount"
+METRICS_API = "/apis/metrics.k8s.io/v1beta1"
+
+CPU_SUFFIXES = {"n": 1e-6, "u": 1e-3, "m": 1.0, "": 1000.0}
+MEMORY_SUFFIXES = {
+    "Ki": 2**10,
+    "Mi": 2**20,
+    "Gi": 2**30,
+    "Ti": 2**40,
+    "k": 10**3,
+    "M": 10**6,
+    "G": 10**9,
+    "T": 10**12,
+    "": 1,
+}
+
+
+def split_quantity(quantity):
+    """Splits a Kubernetes quantity such as '250m' or '64Mi' into number and suffix."""
+    quantity = quantity.strip()
+    index = len(quantity)
+    while index > 0 and quantity[index - 1].isalpha():
+        index -= 1
+    return float(quantity[:index]), quantity[index:]
+
+
+def parse_cpu_quantity(quantity):
+    """Converts a Kubernetes CPU quantity to millicores."""
+    value, suffix = split_quantity(quantity)
+    return value * CPU_SUFFIXES[suffix]
+
+
+def parse_memory_quantity(quantity):
+    """Converts a Kubernetes memory quantity to bytes."""
+    value, suffix = split_quantity(quantity)
+    return value * MEMORY_SUFFIXES[suffix]
+
+
+def parse_timestamp(timestamp):
+    """Converts an RFC 3339 UTC timestamp such as '2024-05-01T12:00:00Z' to epoch seconds."""
+    return calendar.timegm(time.strptime(timestamp[:19], "%Y-%m-%dT%H:%M:%S"))
+
+
+class HttpTransport:
+    """Keeps one persistent (keep-alive) connection to the API server per thread."""
+
+    def __init__(self, host, port, token=None, ca_file=None, use_tls=True, timeout=5.0):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.ssl_context = ssl.create_default_context(cafile=ca_file) if use_tls else None
+        self.local = threading.local()
+
+    def connect(self):
+        if self.use_tls:
+            return http.client.HTTPSConnection(
+                self.host, self.port, timeout=self.timeout, context=self.ssl_context
+            )
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def get(self, path):
+        """Sends a GET request and returns (status, body), reconnecting once if the connection dropped."""
+        headers = {"Accept": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+
+        for attempt in range(2):
+            connection = getattr(self.local, "connection", None)
+            if connection is None:
+                connection = self.local.connection = self.connect()
+            try:
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, ConnectionError, OSError):
+                connection.close()
+                self.local.connection = None
+                if attempt == 1:
+                    raise
+
+    def close(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+
+class MetricsApiClient:
+    """Reads pod and node usage from the metrics.k8s.io API, as `kubectl top` does."""
+
+    def __init__(self, transport, namespace="default"):
+        self.transport = transport
+        self.namespace = namespace
+        self.node_allocatable = {}
+        # Epoch time of the oldest metrics-server sample in the last pod/node response
+        self.pod_sample_time = None
+        self.node_sample_time = None
+
+    @classmethod
+    def in_cluster(cls, namespace=None):
+        """Builds a client from the pod's service account, without loading a kubeconfig."""
+        with open(os.path.join(SERVICE_ACCOUNT_DIR, "token")) as f:
+            token = f.read().strip()
+        if namespace is None:
+            with open(os.path.join(SERVICE_ACCOUNT_DIR, "namespace")) as f:
+                namespace = f.read().strip()
+        transport = HttpTransport(
+            os.environ["KUBERNETES_SERVICE_HOST"],
+            int(os.environ.get("KUBERNETES_SERVICE_PORT", 443)),
+            token=token,
+            ca_file=os.path.join(SERVICE_ACCOUNT_DIR, "ca.crt"),
+        )
+        return cls(transport, namespace)
+
+    def get_json(self, path):
+        status, body = self.transport.get(path)
+        if status != 200:
+            raise RuntimeError(f"GET {path} failed with HTTP {status}: {body[:200]!r}")
+        return json.loads(body)
+
+    def pods_path(self, prefix, label_selector=None):
+        path = f"{prefix}/namespaces/{self.namespace}/pods"
+        if label_selector:
+            path += "?" + urlencode({"labelSelector": label_selector})
+        return path
+
+    def pod_metrics(self, label_selector=None, name_prefix=""):
+        """Returns a list of (pod_name, cpu_millicores, memory_bytes), summed over containers.
+
+        The label selector is applied by the API server, the name prefix before any quantity is parsed.
+        """
+        items = self.get_json(self.pods_path(METRICS_API, label_selector))["items"]
+        pod_data = []
+        sample_times = []
+        for item in items:
+            if not item["metadata"]["name"].startswith(name_prefix):
+                continue
+            sample_times.append(parse_timestamp(item["timestamp"]))
+            cpu = sum(parse_cpu_quantity(c["usage"]["cpu"]) for c in item["containers"])
+            memory = sum(parse_memory_quantity(c["usage"]["memory"]) for c in item["containers"])
+            pod_data.append((item["metadata"]["name"], cpu, memory))
+        self.pod_sample_time = min(sample_times, default=None)
+        return pod_data
+
+    def pod_uids(self, label_selector=None):
+        """Returns a {pod_uid: pod_name} map, used to name the pod cgroups on a node."""
+        items = self.get_json(self.pods_path("/api/v1", label_selector))["items"]
+        return {item["metadata"]["uid"]: item["metadata"]["name"] for item in items}
+
+    def load_node_allocatable(self):
+        """Caches allocatable CPU and memory per node, used for the usage percentages."""
+        for item in self.get_json("/api/v1/nodes")["items"]:
+            allocatable = item["status"]["allocatable"]
+            self.node_allocatable[item["metadata"]["name"]] = (
+                parse_cpu_quantity(allocatable["cpu"]),
+                parse_memory_quantity(allocatable["memory"]),
+            )
+
+    def node_metrics(self):
+        """Returns a list of (node_name, cpu_millicores, cpu_percent, memory_bytes, memory_percent)."""
+        items = self.get_json(f"{METRICS_API}/nodes")["items"]
+        if any(item["metadata"]["name"] not in self.node_allocatable for item in items):
+            self.load_node_allocatable()
+
+        node_data = []
+        for item in items:
+            name = item["metadata"]["name"]
+            cpu = parse_cpu_quantity(item["usage"]["cpu"])
+            memory = parse_memory_quantity(item["usage"]["memory"])
+            cpu_allocatable, memory_allocatable = self.node_allocatable.get(name, (0, 0))
+            cpu_percent = 100.0 * cpu / cpu_allocatable if cpu_allocatable else 0.0
+            memory_percent = 100.0 * memory / memory_allocatable if memory_allocatable else 0.0
+            node_data.append((name, cpu, cpu_percent, memory, memory_percent))
+        self.node_sample_time = min((parse_timestamp(item["timestamp"]) for item in items), default=None)
+        return node_data
+
+    def close(self):
+        self.transport.close()
@@ -1,14 +1,35 @@
 #!/usr/bin/env python
 
+import http.client
+import os
+import re
 import rospy
 import subprocess
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from std_msgs.msg import String
+from cnmpc_recording.msg import MonitorStats, NodeMetrics, PodCgroupMetrics, PodMetrics
+from k8s_metrics_api import MetricsApiClient, parse_cpu_quantity, parse_memory_quantity
+from metrics_sink import NODE_FIELDS, POD_FIELDS, ColumnarSink
 
-def get_k8s_pod_metrics():
+def kubectl_pod_selection(namespace=None, label_selector=None):
+    """Returns the kubectl arguments selecting the namespace and labels of the pods."""
+    args = []
+    if namespace:
+        args += ["--namespace", namespace]
+    if label_selector:
+        args += ["--selector", label_selector]
+    return args
+
+def get_k8s_pod_metrics(namespace=None, label_selector=None):
     """Gets CPU and memory usage of Kubernetes pods using kubectl."""
     try:
         # Execute kubectl top pods command
-        result = subprocess.check_output(["kubectl", "top", "pods"], universal_newlines=True)
+        result = subprocess.check_output(
+            ["kubectl", "top", "pods"] + kubectl_pod_selection(namespace, label_selector),
+            universal_newlines=True,
+        )
         return result
     except subprocess.CalledProcessError as e:
         rospy.logerr(f"Error getting pod metrics: {e}")
@@ -24,65 +45,461 @@ def get_k8s_node_metrics():
         rospy.logerr(f"Error getting node metrics: {e}")
         return None
 
-def parse_k8s_pod_metrics(metrics):
-    """Parses the pod metrics and extracts CPU and memory usage."""
+def get_k8s_pod_uids(namespace=None, label_selector=None):
+    """Gets a {pod_uid: pod_name} map of Kubernetes pods using kubectl."""
+    try:
+        result = subprocess.check_output(
+            ["kubectl", "get", "pods", "--no-headers", "-o", "custom-columns=UID:.metadata.uid,NAME:.metadata.name"]
+            + kubectl_pod_selection(namespace, label_selector),
+            universal_newlines=True,
+        )
+        return dict(line.split() for line in result.splitlines() if line.strip())
+    except subprocess.CalledProcessError as e:
+        rospy.logerr(f"Error getting pod uids: {e}")
+        return None
+
+def parse_k8s_pod_metrics(metrics, name_prefix=""):
+    """Parses the pod metrics into (pod_name, cpu_millicores, memory_bytes) rows of pods starting with name_prefix."""
     pod_data = []
     lines = metrics.splitlines()[1:]  # Skip the header row
     for line in lines:
+        if not line.startswith(name_prefix):
+            continue
         parts = line.split()
         pod_name = parts[0]
-        cpu_usage = parts[1]
-        memory_usage = parts[2]
-        pod_data.append(f"{pod_name}: CPU={cpu_usage}, Memory={memory_usage}")
+        cpu_usage = parse_cpu_quantity(parts[1])
+        memory_usage = parse_memory_quantity(parts[2])
+        pod_data.append((pod_name, cpu_usage, memory_usage))
     return pod_data
 
 def parse_k8s_node_metrics(metrics):
-    """Parses the node metrics and extracts CPU and memory usage."""
+    """Parses the node metrics into (node_name, cpu_millicores, cpu_percent, memory_bytes, memory_percent) rows."""
     node_data = []
     lines = metrics.splitlines()[1:]  # Skip the header row
     for line in lines:
         parts = line.split()
+        if "<unknown>" in parts:
+            continue  # Node has no metrics yet
         node_name = parts[0]
-        cpu_usage_cores = parts[1]
-        cpu_usage_percent = parts[2]
-        memory_usage_bytes = parts[3]
-        memory_usage_percent = parts[4]
-        node_data.append(f"{node_name}: CPU={cpu_usage_cores} cores ({cpu_usage_percent}%), Memory={memory_usage_bytes} bytes ({memory_usage_percent}%)")
+        cpu_usage_cores = parse_cpu_quantity(parts[1])
+        cpu_usage_percent = float(parts[2].rstrip("%"))
+        memory_usage_bytes = parse_memory_quantity(parts[3])
+        memory_usage_percent = float(parts[4].rstrip("%"))
+        node_data.append((node_name, cpu_usage_cores, cpu_usage_percent, memory_usage_bytes, memory_usage_percent))
     return node_data
 
+def format_pod_metrics(pod_rows):
+    """Formats pod rows as the "pod: CPU=123m, Memory=45Mi" strings of /k8s_pod_metrics."""
+    return [
+        f"{pod_name}: CPU={cpu:.0f}m, Memory={memory / 2**20:.0f}Mi"
+        for pod_name, cpu, memory in pod_rows
+    ]
+
+def format_node_metrics(node_rows):
+    """Formats node rows as the strings of /k8s_node_metrics."""
+    return [
+        f"{node_name}: CPU={cpu:.0f}m cores ({cpu_percent:.0f}%%), Memory={memory / 2**20:.0f}Mi bytes ({memory_percent:.0f}%%)"
+        for node_name, cpu, cpu_percent, memory, memory_percent in node_rows
+    ]
+
+def build_pod_metrics_msg(pod_rows, stamp, monotonic_time, keyframe=True, removed_names=()):
+    """Packs one scrape of pod rows into a single PodMetrics message."""
+    msg = PodMetrics()
+    msg.header.stamp = stamp
+    msg.monotonic_time = monotonic_time
+    msg.keyframe = keyframe
+    msg.pod_names = [row[0] for row in pod_rows]
+    msg.cpu_millicores = [row[1] for row in pod_rows]
+    msg.memory_bytes = [row[2] for row in pod_rows]
+    msg.removed_pod_names = list(removed_names)
+    return msg
+
+def build_node_metrics_msg(node_rows, stamp, monotonic_time, keyframe=True, removed_names=()):
+    """Packs one scrape of node rows into a single NodeMetrics message."""
+    msg = NodeMetrics()
+    msg.header.stamp = stamp
+    msg.monotonic_time = monotonic_time
+    msg.keyframe = keyframe
+    msg.node_names = [row[0] for row in node_rows]
+    msg.cpu_millicores = [row[1] for row in node_rows]
+    msg.cpu_percent = [row[2] for row in node_rows]
+    msg.memory_bytes = [row[3] for row in node_rows]
+    msg.memory_percent = [row[4] for row in node_rows]
+    msg.removed_node_names = list(removed_names)
+    return msg
+
+def build_pod_cgroup_metrics_msg(cgroup_rows, stamp, monotonic_time):
+    """Packs one cgroup sample of all pods into a single PodCgroupMetrics message."""
+    msg = PodCgroupMetrics()
+    msg.header.stamp = stamp
+    msg.monotonic_time = monotonic_time
+    msg.pod_names = [row[0] for row in cgroup_rows]
+    msg.cpu_millicores = [row[1] for row in cgroup_rows]
+    msg.memory_bytes = [row[2] for row in cgroup_rows]
+    msg.nr_throttled = [row[3] for row in cgroup_rows]
+    msg.throttled_usec = [row[4] for row in cgroup_rows]
+    return msg
+
+def build_monitor_stats_msg(pod_scrape, node_scrape, cycle_latency, publish_time, missed_deadlines, latencies):
+    """Packs the timings of one monitor cycle into a MonitorStats message."""
+    msg = MonitorStats()
+    msg.header.stamp = rospy.Time.now()
+    msg.monotonic_time = pod_scrape.monotonic_time
+    msg.pod_scrape_latency = pod_scrape.fetch_time
+    msg.node_scrape_latency = node_scrape.fetch_time
+    msg.cycle_scrape_latency = cycle_latency
+    msg.parse_time = pod_scrape.parse_time + node_scrape.parse_time
+    msg.publish_time = publish_time
+    msg.pod_staleness = pod_scrape.staleness
+    msg.node_staleness = node_scrape.staleness
+    msg.missed_deadlines = missed_deadlines
+    msg.scrape_latency_p50 = latencies.percentile(50)
+    msg.scrape_latency_p95 = latencies.percentile(95)
+    msg.scrape_latency_p99 = latencies.percentile(99)
+    return msg
+
+def get_api_metrics(fetch, kind):
+    """Calls a MetricsApiClient method, logging failures like the kubectl getters do."""
+    try:
+        return fetch()
+    except (OSError, http.client.HTTPException, RuntimeError, ValueError, KeyError) as e:
+        rospy.logerr(f"Error getting {kind} metrics: {e}")
+        return None
+
+# One scrape of pods or nodes; staleness is the age of the oldest metrics-server sample (NaN if unknown)
+Scrape = namedtuple("Scrape", "stamp monotonic_time rows fetch_time parse_time staleness")
+
+def sample_staleness(sample_time, stamp):
+    return stamp.to_sec() - sample_time if sample_time is not None else float("nan")
+
+def scrape_pod_metrics(api_client, namespace=None, label_selector=None, name_prefix=""):
+    """Gets and parses one scrape of the selected pods."""
+    stamp, monotonic_time = rospy.Time.now(), time.monotonic()
+    if api_client:
+        # The API client decodes while fetching, so parse time is included in the fetch time
+        pod_rows = get_api_metrics(lambda: api_client.pod_metrics(label_selector, name_prefix), "pod")
+        fetch_time, parse_time = time.monotonic() - monotonic_time, 0.0
+        staleness = sample_staleness(api_client.pod_sample_time, stamp) if pod_rows is not None else float("nan")
+    else:
+        pod_metrics = get_k8s_pod_metrics(namespace, label_selector)
+        fetched = time.monotonic()
+        pod_rows = parse_k8s_pod_metrics(pod_metrics, name_prefix) if pod_metrics else None
+        fetch_time, parse_time = fetched - monotonic_time, time.monotonic() - fetched
+        staleness = float("nan")
+    return Scrape(stamp, monotonic_time, pod_rows, fetch_time, parse_time, staleness)
+
+def scrape_node_metrics(api_client):
+    """Gets and parses one node scrape."""
+    stamp, monotonic_time = rospy.Time.now(), time.monotonic()
+    if api_client:
+        node_rows = get_api_metrics(api_client.node_metrics, "node")
+        fetch_time, parse_time = time.monotonic() - monotonic_time, 0.0
+        staleness = sample_staleness(api_client.node_sample_time, stamp) if node_rows is not None else float("nan")
+    else:
+        node_metrics = get_k8s_node_metrics()
+        fetched = time.monotonic()
+        node_rows = parse_k8s_node_metrics(node_metrics) if node_metrics else None
+        fetch_time, parse_time = fetched - monotonic_time, time.monotonic() - fetched
+        staleness = float("nan")
+    return Scrape(stamp, monotonic_time, node_rows, fetch_time, parse_time, staleness)
+
+class RollingPercentiles:
+    """Keeps the last ``window`` values and reports their percentiles."""
+
+    def __init__(self, window=300):
+        self.values = deque(maxlen=window)
+
+    def add(self, value):
+        self.values.append(value)
+
+    def percentile(self, q):
+        """Nearest-rank percentile, q in [0, 100]."""
+        if not self.values:
+            return float("nan")
+        ordered = sorted(self.values)
+        return ordered[min(len(ordered) - 1, int(q / 100.0 * len(ordered)))]
+
+class DeadlineScheduler:
+    """Sleeps until fixed deadlines start + k * period, so slow cycles don't shift later samples."""
+
+    def __init__(self, rate_hz):
+        self.period = 1.0 / rate_hz
+        self.next_deadline = time.monotonic() + self.period
+        self.overruns = 0
+
+    def sleep(self):
+        """Sleeps until the next deadline, skipping (and counting) any deadlines already missed."""
+        now = time.monotonic()
+        if now >= self.next_deadline:
+            missed = int((now - self.next_deadline) / self.period) + 1
+            self.overruns += missed
+            self.next_deadline += missed * self.period
+        time.sleep(self.next_deadline - now)
+        self.next_deadline += self.period
+
+class DeltaFilter:
+    """Keeps only the rows whose values changed since the last scrape, with a full keyframe
+    every ``keyframe_interval`` scrapes (every scrape when it is 1 or less). Pods that
+    disappear are listed as removed in the next delta."""
+
+    def __init__(self, keyframe_interval):
+        self.keyframe_interval = max(1, int(keyframe_interval))
+        self.scrapes = 0
+        self.last_values = {}
+
+    def filter(self, rows):
+        """Returns (rows, keyframe, removed_names) to publish for one scrape."""
+        keyframe = self.scrapes % self.keyframe_interval == 0
+        self.scrapes += 1
+        values = {row[0]: row[1:] for row in rows}
+        if keyframe:
+            self.last_values = values
+            return rows, True, []
+
+        changed_rows = [row for row in rows if self.last_values.get(row[0]) != row[1:]]
+        removed_names = [name for name in self.last_values if name not in values]
+        self.last_values = values
+        return changed_rows, False, removed_names
+
+class CgroupSampler:
+    """Samples cgroup v2 CPU, memory and throttling counters of the pods on the local node.
+
+    Pod directories are rediscovered on a worker thread every ``rediscover_period`` seconds.
+    """
+
+    POD_DIR = re.compile(r"pod([0-9a-f]{8}[-_][0-9a-f]{4}[-_][0-9a-f]{4}[-_][0-9a-f]{4}[-_][0-9a-f]{12})(\.slice)?$")
+
+    def __init__(self, cgroup_root="/sys/fs/cgroup", get_pod_uids=get_k8s_pod_uids, pod_prefix="cnmpc-", rediscover_period=10.0, retry_period=1.0):
+        self.cgroup_root = cgroup_root
+        self.get_pod_uids = get_pod_uids
+        self.pod_prefix = pod_prefix
+        self.rediscover_period = rediscover_period
+        self.retry_period = retry_period
+        self.pod_uids = {}
+        self.pod_dirs = {}
+        self.next_discovery = 0.0
+        self.discovery = None  # Future of the discovery running on the executor
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.previous = {}
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+    def retry_discovery(self, now):
+        """Brings the next discovery forward to at most retry_period seconds from now."""
+        self.next_discovery = min(self.next_discovery, now + self.retry_period)
+
+    def request_discovery(self, now):
+        """Starts a discovery on the worker thread unless one is still running."""
+        if self.discovery is not None:
+            if not self.discovery.done():
+                return
+            if self.discovery.exception() is not None:
+                rospy.logerr(f"Error discovering pod cgroups: {self.discovery.exception()}")
+        self.next_discovery = now + self.rediscover_period
+        self.discovery = self.executor.submit(self.discover)
+
+    def discover(self):
+        """Maps the names of the matching pods to their cgroup directories."""
+        pod_uids = self.get_pod_uids()
+        if pod_uids is None:
+            # Keep the names of the last lookup rather than falling back to uids the prefix filters out
+            self.retry_discovery(time.monotonic())
+        else:
+            self.pod_uids = pod_uids
+        pod_dirs = {}
+        for entry in os.listdir(self.cgroup_root):
+            if not entry.startswith("kubepods"):
+                continue
+            for dirpath, dirnames, _ in os.walk(os.path.join(self.cgroup_root, entry)):
+                for dirname in list(dirnames):
+                    match = self.POD_DIR.search(dirname)
+                    if not match:
+                        continue
+                    dirnames.remove(dirname)  # Don't descend into the containers of a pod
+                    uid = match.group(1).replace("_", "-")
+                    pod_name = self.pod_uids.get(uid, uid)
+                    if pod_name.startswith(self.pod_prefix):
+                        pod_dirs[pod_name] = os.path.join(dirpath, dirname)
+        self.pod_dirs = pod_dirs
+
+    @staticmethod
+    def read_counters(pod_dir):
+        """Reads (usage_usec, nr_throttled, throttled_usec, memory_bytes) of one pod cgroup."""
+        cpu_stat = {}
+        with open(os.path.join(pod_dir, "cpu.stat")) as f:
+            for line in f:
+                key, value = line.split()
+                cpu_stat[key] = int(value)
+        with open(os.path.join(pod_dir, "memory.current")) as f:
+            memory_bytes = int(f.read())
+        return cpu_stat["usage_usec"], cpu_stat.get("nr_throttled", 0), cpu_stat.get("throttled_usec", 0), memory_bytes
+
+    def sample(self):
+        """Returns (pod_name, cpu_millicores, memory_bytes, nr_throttled, throttled_usec) rows since the last sample."""
+        now = time.monotonic()
+        if now >= self.next_discovery:
+            self.request_discovery(now)
+
+        cgroup_data = []
+        current = {}
+        for pod_name, pod_dir in self.pod_dirs.items():
+            try:
+                usage_usec, nr_throttled, throttled_usec, memory_bytes = self.read_counters(pod_dir)
+            except (OSError, KeyError, ValueError):
+                self.retry_discovery(now)  # Pod is gone, look again soon
+                continue
+            # Keyed by directory: a pod recreated under the same name starts new counters
+            current[pod_dir] = (now, usage_usec, nr_throttled, throttled_usec)
+            if pod_dir not in self.previous:
+                continue
+            last_time, last_usage_usec, last_nr_throttled, last_throttled_usec = self.previous[pod_dir]
+            elapsed_usec = (now - last_time) * 1e6
+            cpu_millicores = 1000.0 * (usage_usec - last_usage_usec) / elapsed_usec
+            cgroup_data.append((pod_name, cpu_millicores, memory_bytes, nr_throttled - last_nr_throttled, throttled_usec - last_throttled_usec))
+        self.previous = current
+        return cgroup_data
+
 def k8s_resource_monitor():
     """ROS node to monitor and publish Kubernetes resource usage metrics."""
     # Initialize the ROS node
     rospy.init_node('k8s_resource_monitor', anonymous=True)
 
-    # Create ROS publishers
-    pod_pub = rospy.Publisher('/k8s_pod_metrics', String, queue_size=10)
-    node_pub = rospy.Publisher('/k8s_node_metrics', String, queue_size=10)
+    # Create ROS publishers, one batched message per scrape
+    pod_batch_pub = rospy.Publisher('/k8s_pod_metrics_batch', PodMetrics, queue_size=10)
+    node_batch_pub = rospy.Publisher('/k8s_node_metrics_batch', NodeMetrics, queue_size=10)
 
-    # Define rate for the loop (1Hz)
-    rate = rospy.Rate(1)
+    # The per-pod string topics are kept for the existing analysis scripts
+    publish_strings = rospy.get_param("~publish_strings", True)
+    if publish_strings:
+        pod_pub = rospy.Publisher('/k8s_pod_metrics', String, queue_size=10)
+        node_pub = rospy.Publisher('/k8s_node_metrics', String, queue_size=10)
 
-    while not rospy.is_shutdown():
-        # Get pod and node metrics
-        pod_metrics = get_k8s_pod_metrics()
-        node_metrics = get_k8s_node_metrics()
+    # Only the selected pods are scraped, parsed and published
+    namespace = rospy.get_param("~namespace", None)
+    label_selector = rospy.get_param("~label_selector", None)
+    name_prefix = rospy.get_param("~name_prefix", "")
+
+    # "kubectl" forks `kubectl top` every cycle, "api" keeps a connection to metrics.k8s.io open
+    backend = rospy.get_param("~backend", "kubectl")
+    api_client = MetricsApiClient.in_cluster(namespace) if backend == "api" else None
+    if api_client:
+        rospy.on_shutdown(api_client.close)
+
+    # Optional high-frequency sampler reading the pod cgroups of the local node directly
+    if rospy.get_param("~cgroup_sampler", False):
+        cgroup_pub = rospy.Publisher('/k8s_pod_cgroup_metrics', PodCgroupMetrics, queue_size=10)
+        cgroup_sampler = CgroupSampler(
+            rospy.get_param("~cgroup_root", "/sys/fs/cgroup"),
+            get_pod_uids=(
+                (lambda: get_api_metrics(lambda: api_client.pod_uids(label_selector), "pod uid"))
+                if api_client
+                else (lambda: get_k8s_pod_uids(namespace, label_selector))
+            ),
+            pod_prefix=rospy.get_param("~cgroup_pod_prefix", name_prefix or "cnmpc-"),
+        )
+        rospy.on_shutdown(cgroup_sampler.close)
+
+        def publish_cgroup_metrics(event):
+            stamp, monotonic_time = rospy.Time.now(), time.monotonic()
+            cgroup_rows = cgroup_sampler.sample()
+            if cgroup_rows:
+                cgroup_pub.publish(build_pod_cgroup_metrics_msg(cgroup_rows, stamp, monotonic_time))
+
+        rospy.Timer(rospy.Duration(1.0 / rospy.get_param("~cgroup_rate", 20.0)), publish_cgroup_metrics)
+
+    # In delta mode the batched topics only carry pods whose values changed, plus periodic keyframes
+    delta_mode = rospy.get_param("~delta_mode", False)
+    keyframe_interval = rospy.get_param("~keyframe_interval", 30)
+    if keyframe_interval <= 1 and delta_mode:
+        rospy.logwarn("keyframe_interval <= 1, every scrape is published as a keyframe")
+    pod_delta_filter = DeltaFilter(keyframe_interval)
+    node_delta_filter = DeltaFilter(keyframe_interval)
+
+    # Pod and node scrapes run concurrently on their own worker threads
+    executor = ThreadPoolExecutor(max_workers=2)
+    rospy.on_shutdown(executor.shutdown)
+
+    # Define rate for the loop (1Hz by default)
+    scheduler = DeadlineScheduler(rospy.get_param("~rate", 1.0))
+
+    # Optional columnar sink, so the analysis can load the metrics without going through a bag
+    sink_dir = rospy.get_param("~sink_dir", "")
+    sinks = None
+    if sink_dir:
+        sink_format = rospy.get_param("~sink_format", "arrow")
+        rotate_rows = rospy.get_param("~sink_rotate_rows", 1000000)
+        sinks = (
+            ColumnarSink(sink_dir, "k8s_pod_metrics", POD_FIELDS, sink_format, rotate_rows=rotate_rows),
+            ColumnarSink(sink_dir, "k8s_node_metrics", NODE_FIELDS, sink_format, rotate_rows=rotate_rows),
+        )
+
+    # Self-instrumentation of every cycle, with a rate-limited log summary instead of per-metric logs
+    stats_pub = rospy.Publisher('/k8s_monitor_stats', MonitorStats, queue_size=10)
+    latencies = RollingPercentiles(rospy.get_param("~stats_window", 300))
+    log_period = rospy.get_param("~log_period", 30.0)
+
+    # The sinks are closed here rather than in a shutdown hook, so the writers are never
+    # closed on the signal thread while the loop is still appending to them
+    try:
+        while not rospy.is_shutdown():
+            # Get and parse pod and node metrics
+            cycle_start = time.monotonic()
+            pod_future = executor.submit(scrape_pod_metrics, api_client, namespace, label_selector, name_prefix)
+            node_future = executor.submit(scrape_node_metrics, api_client)
+            pod_scrape = pod_future.result()
+            node_scrape = node_future.result()
+            publish_start = time.monotonic()
+
+            if pod_scrape.rows is not None:
+                # Publish pod metrics
+                batch_rows, keyframe, removed = pod_delta_filter.filter(pod_scrape.rows) if delta_mode else (pod_scrape.rows, True, [])
+                pod_batch_pub.publish(
+                    build_pod_metrics_msg(batch_rows, pod_scrape.stamp, pod_scrape.monotonic_time, keyframe, removed)
+                )
+                if publish_strings:
+                    for pod_metric in format_pod_metrics(pod_scrape.rows):
+                        pod_pub.publish(pod_metric)
+
+            if node_scrape.rows is not None:
+                # Publish node metrics
+                batch_rows, keyframe, removed = node_delta_filter.filter(node_scrape.rows) if delta_mode else (node_scrape.rows, True, [])
+                node_batch_pub.publish(
+                    build_node_metrics_msg(batch_rows, node_scrape.stamp, node_scrape.monotonic_time, keyframe, removed)
+                )
+                if publish_strings:
+                    for node_metric in format_node_metrics(node_scrape.rows):
+                        node_pub.publish(node_metric)
+
+            if sinks:
+                for sink, scrape in zip(sinks, (pod_scrape, node_scrape)):
+                    if scrape.rows is not None:
+                        sink.append(scrape.stamp.to_sec(), scrape.monotonic_time, scrape.rows)
+
+            # Publish the timings of this cycle
+            cycle_latency = publish_start - cycle_start
+            latencies.add(cycle_latency)
+            stats_pub.publish(
+                build_monitor_stats_msg(
+                    pod_scrape, node_scrape, cycle_latency, time.monotonic() - publish_start, scheduler.overruns, latencies
+                )
+            )
+            rospy.loginfo_throttle(
+                log_period,
+                f"Published {len(pod_scrape.rows or [])} pods and {len(node_scrape.rows or [])} nodes, "
+                f"scrape latency p50/p95/p99 = {latencies.percentile(50):.3f}/{latencies.percentile(95):.3f}/"
+                f"{latencies.percentile(99):.3f} s, {scheduler.overruns} deadlines missed",
+            )
 
-        if pod_metrics:
-            # Parse and publish pod metrics
-            parsed_pod_metrics = parse_k8s_pod_metrics(pod_metrics)
-            for pod_metric in parsed_pod_metrics:
-                rospy.loginfo(f"Pod Metric: {pod_metric}")
-                pod_pub.publish(pod_metric)
-
-        if node_metrics:
-            # Parse and publish node metrics
-            parsed_node_metrics = parse_k8s_node_metrics(node_metrics)
-            for node_metric in parsed_node_metrics:
-                rospy.loginfo(f"Node Metric: {node_metric}")
-                node_pub.publish(node_metric)
-
-        # Sleep to maintain loop rate
-        rate.sleep()
+            # Sleep to the next deadline of the loop rate
+            overruns = scheduler.overruns
+            scheduler.sleep()
+            if scheduler.overruns > overruns:
+                rospy.logwarn_throttle(log_period, f"Scrape overran its period, {scheduler.overruns} deadlines missed so far")
+    finally:
+        if sinks:
+            for sink in sinks:
+                sink.close()
 
 if __name__ == '__main__':
     try:
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+import os
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Arrow is written in the IPC stream format (.arrows), whose record batches stay readable
+# when the file is cut short; Parquet files only get their footer on close
+FILE_EXTENSIONS = {"parquet": ".parquet", "arrow": ".arrows"}
+
+# Columns of the sink files as (name, pyarrow type name)
+POD_FIELDS = [
+    ("time", "float64"),
+    ("monotonic_time", "float64"),
+    ("pod", "string"),
+    ("cpu_millicores", "float64"),
+    ("memory_bytes", "float64"),
+]
+NODE_FIELDS = [
+    ("time", "float64"),
+    ("monotonic_time", "float64"),
+    ("node", "string"),
+    ("cpu_millicores", "float64"),
+    ("cpu_percent", "float64"),
+    ("memory_bytes", "float64"),
+    ("memory_percent", "float64"),
+]
+
+
+class ColumnarSink:
+    """Appends scrape rows to rotating Parquet or Arrow IPC stream files with typed columns.
+
+    A crash loses the unflushed rows, and with Parquet the whole open file.
+    """
+
+    def __init__(self, directory, prefix, fields, file_format="arrow", flush_rows=1000, rotate_rows=1000000, rotate_seconds=3600.0):
+        if pa is None:
+            raise ImportError("pyarrow is required for the columnar metrics sink")
+        if file_format not in FILE_EXTENSIONS:
+            raise ValueError(f"Unknown sink format {file_format!r}, expected one of {sorted(FILE_EXTENSIONS)}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.prefix = prefix
+        self.schema = pa.schema([(name, pa.type_for_alias(type_name)) for name, type_name in fields])
+        self.file_format = file_format
+        self.flush_rows = flush_rows
+        self.rotate_rows = rotate_rows
+        self.rotate_seconds = rotate_seconds
+        self.buffer = []
+        self.writer = None
+        self.file_rows = 0
+        self.file_opened = 0.0
+        self.file_index = 0
+
+    def open_writer(self):
+        name = f"{self.prefix}-{time.strftime('%Y%m%d-%H%M%S')}-{self.file_index:04d}{FILE_EXTENSIONS[self.file_format]}"
+        path = os.path.join(self.directory, name)
+        self.file_index += 1
+        self.file_rows = 0
+        self.file_opened = time.monotonic()
+        if self.file_format == "parquet":
+            self.writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self.writer = pa.ipc.new_stream(path, self.schema)
+
+    def append(self, time_sec, monotonic_time, rows):
+        """Buffers one scrape; each row is (name, value, ...) in the order of the schema."""
+        for row in rows:
+            self.buffer.append((time_sec, monotonic_time) + tuple(row))
+        if len(self.buffer) >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        if self.writer is not None and (
+            self.file_rows >= self.rotate_rows or time.monotonic() - self.file_opened > self.rotate_seconds
+        ):
+            self.writer.close()
+            self.writer = None
+        if self.writer is None:
+            self.open_writer()
+
+        columns = list(zip(*self.buffer))
+        batch = pa.record_batch(
+            [pa.array(column, type=field.type) for column, field in zip(columns, self.schema)], schema=self.schema
+        )
+        if self.file_format == "parquet":
+            self.writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self.writer.write_batch(batch)
+        self.file_rows += len(self.buffer)
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
@@ -0,0 +1,146 @@
+import hashlib
+import os
+import shutil
+import sys
+import numpy as np
+
+CACHE_DIR = os.environ.get(
+    "CNMPC_BAG_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "cnmpc_recording")
+)
+MAX_CACHE_BYTES = int(os.environ.get("CNMPC_BAG_CACHE_MAX_BYTES", 4 * 2**30))
+HASH_BYTES = 2**20
+TMP_SUFFIX = ".tmp.npz"
+
+
+def bag_directory(bag_file):
+    """Cache directory holding the decoded topics of one bag path"""
+    path_hash = hashlib.sha1(os.path.abspath(bag_file).encode()).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, path_hash)
+
+
+def bag_key(bag_file):
+    """Hashes path, size, mtime and the first and last MiB of the bag
+
+    Hashing the ends instead of the whole file keeps the lookup fast on multi-GB bags;
+    rosbag writes its index at the end, so any rewrite of the bag changes the key.
+    """
+    stat = os.stat(bag_file)
+    digest = hashlib.sha1(f"{os.path.abspath(bag_file)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    with open(bag_file, "rb") as f:
+        digest.update(f.read(HASH_BYTES))
+        f.seek(max(0, stat.st_size - HASH_BYTES))
+        digest.update(f.read(HASH_BYTES))
+    return digest.hexdigest()[:16]
+
+
+def entry_path(bag_file, key, topic, window=None, fields=None):
+    # Windowed and projected reads are cached separately from the full topic
+    topic_id = topic if window is None else f"{topic}@{window}"
+    if fields is not None:
+        topic_id += f"[{','.join(sorted(fields))}]"
+    topic_hash = hashlib.sha1(topic_id.encode()).hexdigest()[:16]
+    return os.path.join(bag_directory(bag_file), f"{key}-{topic_hash}.npz")
+
+
+def get(bag_file, key, topic, window=None, fields=None):
+    """Returns the cached columns of a topic, or None on a miss"""
+    path = entry_path(bag_file, key, topic, window, fields)
+    try:
+        with np.load(path, allow_pickle=True) as entry:
+            columns = {name: entry[name] for name in entry.files}
+    except (OSError, ValueError):
+        return None
+    # Mark as recently used for the LRU eviction, unless another process just evicted it
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return columns
+
+
+def put(bag_file, key, topic, columns, window=None, fields=None):
+    """Stores the columns of a topic and evicts least recently used entries over the size limit"""
+    directory = bag_directory(bag_file)
+    os.makedirs(directory, exist_ok=True)
+
+    # Entries of an older version of this bag can never be hit again
+    for name in os.listdir(directory):
+        if not name.startswith(key):
+            remove(os.path.join(directory, name))
+
+    # Other processes of map_bags may write the same entry, so each writes its own temp file
+    path = entry_path(bag_file, key, topic, window, fields)
+    tmp_path = f"{path}.{os.getpid()}{TMP_SUFFIX}"
+    try:
+        np.savez(tmp_path, **columns)
+        os.replace(tmp_path, path)
+    finally:
+        remove(tmp_path)
+    evict()
+
+
+def try_put(bag_file, key, topic, columns, window=None, fields=None):
+    """put that only prints a failed cache write, since the columns were read anyway"""
+    try:
+        put(bag_file, key, topic, columns, window, fields)
+    except OSError as e:
+        print(f"Could not cache {topic} of {bag_file}: {e}")
+
+
+def remove(path):
+    """Deletes a file another process may already have deleted"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def cache_entries():
+    """Lists (path, size, last use) of every cache entry"""
+    entries = []
+    for directory, _, names in os.walk(CACHE_DIR):
+        for name in names:
+            # Temp files are about to be renamed and entries may be evicted by another process
+            if name.endswith(TMP_SUFFIX):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+    return entries
+
+
+def evict(max_bytes=None):
+    """Deletes least recently used entries until the cache fits in max_bytes"""
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    entries = sorted(cache_entries(), key=lambda entry: entry[2])
+    total = sum(size for _, size, _ in entries)
+    for path, size, _ in entries:
+        if total <= max_bytes:
+            break
+        remove(path)
+        total -= size
+
+
+def invalidate(bag_files=None):
+    """Drops the cached topics of the given bags, or the whole cache"""
+    if not bag_files:
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+        return
+    for bag_file in bag_files:
+        shutil.rmtree(bag_directory(bag_file), ignore_errors=True)
+
+
+if __name__ == "__main__":
+    # Usage: python bag_cache.py invalidate [bag ...] | info
+    command = sys.argv[1] if len(sys.argv) > 1 else "info"
+    if command == "invalidate":
+        invalidate(sys.argv[2:])
+    elif command == "info":
+        entries = cache_entries()
+        total = sum(size for _, size, _ in entries)
+        print(f"{CACHE_DIR}: {len(entries)} entries, {total / 2**20:.1f} MiB of {MAX_CACHE_BYTES / 2**20:.0f} MiB")
+    else:
+        sys.exit(f"Unknown command {command}, expected 'invalidate' or 'info'")
@@ -0,0 +1,183 @@
+import glob
+import os
+import re
+import sqlite3
+import sys
+import bag_cache
+import rosbag_lite
+
+CATALOG_PATH = os.environ.get(
+    "CNMPC_BAG_CATALOG", os.path.join(os.path.expanduser("~"), ".cache", "cnmpc_bag_catalog.sqlite")
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bags (
+    path TEXT PRIMARY KEY,
+    key TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    start_time REAL,
+    end_time REAL,
+    message_count INTEGER,
+    chunk_count INTEGER,
+    n_apc INTEGER,
+    horizon INTEGER
+);
+CREATE TABLE IF NOT EXISTS topics (
+    path TEXT,
+    topic TEXT,
+    msg_type TEXT,
+    message_count INTEGER,
+    start_time REAL,
+    end_time REAL,
+    PRIMARY KEY (path, topic)
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    path TEXT,
+    position INTEGER,
+    compression TEXT,
+    start_time REAL,
+    end_time REAL,
+    message_count INTEGER,
+    PRIMARY KEY (path, position)
+);
+CREATE INDEX IF NOT EXISTS topics_by_name ON topics (topic);
+CREATE INDEX IF NOT EXISTS bags_by_parameters ON bags (n_apc, horizon);
+"""
+
+
+def connect(catalog_path=None):
+    """Opens the catalog database, creating its tables if needed"""
+    catalog_path = catalog_path or CATALOG_PATH
+    os.makedirs(os.path.dirname(os.path.abspath(catalog_path)), exist_ok=True)
+    connection = sqlite3.connect(catalog_path)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def parse_bag_parameters(bag_file):
+    """Parses (n_apc, horizon) from names like journal_data_cpu_n3_h10.bag, or (None, None)"""
+    match = re.search(r"_n(\d+)_h(\d+)", os.path.basename(bag_file))
+    if match is None:
+        return None, None
+    return int(match.group(1)), int(match.group(2))
+
+
+def index_bag(connection, bag_file):
+    """Records the topics, counts, time ranges and chunk layout of one bag from its index"""
+    path = os.path.abspath(bag_file)
+    stat = os.stat(path)
+    connection.execute("DELETE FROM topics WHERE path = ?", (path,))
+    connection.execute("DELETE FROM chunks WHERE path = ?", (path,))
+
+    topics = {}
+    with rosbag_lite.Bag(path) as bag:
+        for chunk in bag.chunks:
+            compression, times = bag.chunk_index(chunk)
+            connection.execute(
+                "INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+                (path, chunk.position, compression, chunk.start_time, chunk.end_time,
+                 sum(chunk.message_counts.values())),
+            )
+            for conn_id, count in chunk.message_counts.items():
+                bag_connection = bag.connections[conn_id]
+                # Without index data records only the chunk time range is known
+                conn_times = times.get(conn_id)
+                start, end = (chunk.start_time, chunk.end_time) if conn_times is None else (conn_times.min(), conn_times.max())
+                topic = topics.setdefault(bag_connection.topic, [bag_connection.type, 0, start, end])
+                topic[1] += count
+                topic[2] = min(topic[2], start)
+                topic[3] = max(topic[3], end)
+
+        start_time = bag.get_start_time() if bag.chunks else None
+        end_time = bag.get_end_time() if bag.chunks else None
+        chunk_count = len(bag.chunks)
+
+    connection.executemany(
+        "INSERT INTO topics VALUES (?, ?, ?, ?, ?, ?)",
+        [(path, topic, msg_type, count, float(start), float(end)) for topic, (msg_type, count, start, end) in topics.items()],
+    )
+    n_apc, horizon = parse_bag_parameters(path)
+    connection.execute(
+        "INSERT OR REPLACE INTO bags VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (path, bag_cache.bag_key(path), stat.st_size, stat.st_mtime_ns, start_time, end_time,
+         sum(topic[1] for topic in topics.values()), chunk_count, n_apc, horizon),
+    )
+
+
+def scan(directory, catalog_path=None, pattern="*.bag"):
+    """Indexes every bag of a directory, skipping bags unchanged since the last scan
+
+    Bags that were removed from the directory are dropped from the catalog. Returns the
+    number of bags (re)indexed.
+    """
+    directory = os.path.abspath(directory)
+    bag_files = sorted(glob.glob(os.path.join(directory, pattern)))
+    indexed = 0
+    with connect(catalog_path) as connection:
+        known = {
+            path: (size, mtime_ns)
+            for path, size, mtime_ns in connection.execute(
+                "SELECT path, size, mtime_ns FROM bags WHERE path LIKE ?", (os.path.join(directory, "%"),)
+            )
+        }
+        for bag_file in bag_files:
+            stat = os.stat(bag_file)
+            if known.pop(bag_file, None) == (stat.st_size, stat.st_mtime_ns):
+                continue
+            try:
+                index_bag(connection, bag_file)
+                indexed += 1
+            except (OSError, ValueError) as e:
+                print(f"Skipping {bag_file}: {e}")
+        for path in known:
+            if os.path.dirname(path) == directory:
+                for table in ("bags", "topics", "chunks"):
+                    connection.execute(f"DELETE FROM {table} WHERE path = ?", (path,))
+    connection.close()
+    return indexed
+
+
+def find_bags(topic=None, n_apc=None, horizon=None, catalog_path=None):
+    """Lists catalogued bag paths, optionally only those with a topic or given (n_apc, horizon)"""
+    query = "SELECT DISTINCT bags.path FROM bags LEFT JOIN topics ON topics.path = bags.path WHERE 1"
+    arguments = []
+    for column, value in (("topics.topic", topic), ("bags.n_apc", n_apc), ("bags.horizon", horizon)):
+        if value is not None:
+            query += f" AND {column} = ?"
+            arguments.append(value)
+    query += " ORDER BY bags.n_apc, bags.horizon, bags.path"
+    connection = connect(catalog_path)
+    try:
+        return [path for (path,) in connection.execute(query, arguments)]
+    finally:
+        connection.close()
+
+
+def bag_topics(bag_file, catalog_path=None):
+    """Returns {topic: (msg_type, message_count, start_time, end_time)} of a catalogued bag"""
+    connection = connect(catalog_path)
+    try:
+        rows = connection.execute(
+            "SELECT topic, msg_type, message_count, start_time, end_time FROM topics WHERE path = ? ORDER BY topic",
+            (os.path.abspath(bag_file),),
+        )
+        return {topic: tuple(values) for topic, *values in rows}
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    # Usage: python bag_catalog.py scan <directory> | list [topic] | topics <bag>
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    if command == "scan":
+        directory = sys.argv[2] if len(sys.argv) > 2 else "."
+        print(f"Indexed {scan(directory)} bags from {directory} into {CATALOG_PATH}")
+    elif command == "list":
+        for path in find_bags(topic=sys.argv[2] if len(sys.argv) > 2 else None):
+            print(path)
+    elif command == "topics":
+        for topic, (msg_type, count, start, end) in bag_topics(sys.argv[2]).items():
+            print(f"{topic} [{msg_type}]: {count} messages, {end - start:.1f} s")
+    else:
+        sys.exit(f"Unknown command {command}, expected 'scan', 'list' or 'topics'")
@@ -0,0 +1,227 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import bag_cache
+import rosbag_lite
+
+# Chunks are always indexed and decompressed in parallel by rosbag_lite. When ROS is
+# installed the messages are deserialized by genpy as rosbag does; set
+# CNMPC_BAG_READER=lite to decode them with rosbag_lite's own decoders instead
+try:
+    from genpy.dynamic import generate_dynamic
+except ImportError:
+    generate_dynamic = None
+if os.environ.get("CNMPC_BAG_READER") == "lite":
+    generate_dynamic = None
+
+# bag_cache entry holding the topic types of a bag (topic names start with "/")
+TYPES_ENTRY = "types"
+
+
+def message_columns(msg, prefix=""):
+    """Flattens a genpy message into bagpy-style {column: value} pairs, e.g. "header.stamp.secs" """
+    columns = {}
+    for name, slot_type in zip(msg.__slots__, msg._slot_types):
+        value = getattr(msg, name)
+        if slot_type in ("time", "duration"):
+            columns[f"{prefix}{name}.secs"] = value.secs
+            columns[f"{prefix}{name}.nsecs"] = value.nsecs
+        elif hasattr(value, "_slot_types"):
+            columns.update(message_columns(value, f"{prefix}{name}."))
+        elif isinstance(value, list) and value and hasattr(value[0], "_slot_types"):
+            columns[prefix + name] = [message_columns(element) for element in value]
+        else:
+            columns[prefix + name] = value
+    return columns
+
+
+def bag_topic_types(bag_file, use_cache=True):
+    """Returns {topic: message type} of the connections recorded in the bag
+
+    Only the index section is parsed (with rosbag_lite, whichever reader is used), and the
+    result is kept in the bag_cache like the topics, so cached bags are not opened at all.
+    """
+    key = bag_cache.bag_key(bag_file) if use_cache else None
+    if key is not None:
+        cached = bag_cache.get(bag_file, key, TYPES_ENTRY)
+        if cached is not None:
+            return dict(zip(cached["topics"].tolist(), cached["types"].tolist()))
+
+    with rosbag_lite.Bag(bag_file) as bag:
+        topic_types = {connection.topic: connection.type for connection in bag.connections.values()}
+    if key is not None:
+        columns = {"topics": list(topic_types), "types": list(topic_types.values())}
+        bag_cache.try_put(bag_file, key, TYPES_ENTRY, {name: np.array(values, dtype=str) for name, values in columns.items()})
+    return topic_types
+
+
+def check_fields(topic, columns, names):
+    """Raises a KeyError naming the topic and field when a requested column is not in columns"""
+    for name in names:
+        if name not in columns:
+            raise KeyError(f"{topic} messages have no field {name!r}, only {sorted(columns)}")
+
+
+def project_columns(topic, columns, names):
+    """Keeps the named columns of a message (see check_fields)"""
+    try:
+        return {name: columns[name] for name in names}
+    except KeyError:
+        check_fields(topic, columns, names)
+        raise
+
+
+def prefetch(iterable, depth=None, batch_size=256):
+    """Iterates iterable on a worker thread, up to `depth` batches of items ahead of the caller
+
+    depth defaults to $CNMPC_BAG_PREFETCH or 8. Exceptions of the worker are raised in the
+    caller, and closing the generator early stops the worker.
+    """
+    depth = depth or int(os.environ.get("CNMPC_BAG_PREFETCH", 0)) or 8
+    batches = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(value):
+        while not stop.is_set():
+            try:
+                batches.put(value, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            batch = []
+            for item in iterable:
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    if not put(batch):
+                        return
+                    batch = []
+            if batch and not put(batch):
+                return
+            put(None)
+        except BaseException as e:
+            put(e)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(produce)
+        try:
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    return
+                if isinstance(batch, BaseException):
+                    raise batch
+                yield from batch
+        finally:
+            stop.set()
+
+
+def bag_start_time(bag_file):
+    """Receive time of the first message in the bag"""
+    with rosbag_lite.Bag(bag_file) as bag:
+        return bag.get_start_time()
+
+
+def iter_bag(bag_file, topics, start=None, end=None, relative=True, fields=None):
+    """Yields (topic, receive time, columns) of the topics between start and end seconds
+
+    start and end (inclusive) are relative to the start of the bag unless relative is
+    False. The chunk index is used to skip every chunk outside the window, so those
+    chunks are never decompressed, and the others are decompressed on rosbag_lite's
+    thread pool. fields optionally maps topics to the columns to keep; rosbag_lite does
+    not even decode the others. genpy deserializes on a worker thread (see prefetch).
+    """
+    fields = fields or {}
+    if generate_dynamic is None:
+        with rosbag_lite.Bag(bag_file) as bag:
+            start_time, end_time = absolute_window(bag, start, end, relative)
+            # Projected messages only hold the requested columns, so check them against the definitions
+            for connection in bag.connections.values():
+                if connection.topic in fields and (topics is None or connection.topic in topics):
+                    check_fields(connection.topic, connection.columns(), fields[connection.topic])
+            for topic, columns, t in bag.read_messages(topics, start_time, end_time, fields):
+                yield topic, t, columns
+        return
+
+    def read():
+        with rosbag_lite.Bag(bag_file) as bag:
+            start_time, end_time = absolute_window(bag, start, end, relative)
+            message_types = {}
+            for connection, message, t in bag.read_raw(topics, start_time, end_time):
+                if connection.type not in message_types:
+                    message_types[connection.type] = generate_dynamic(connection.type, connection.definition)[
+                        connection.type
+                    ]
+                columns = message_columns(message_types[connection.type]().deserialize(bytes(message)))
+                if connection.topic in fields:
+                    columns = project_columns(connection.topic, columns, fields[connection.topic])
+                yield connection.topic, t, columns
+
+    yield from prefetch(read())
+
+
+def absolute_window(bag, start, end, relative):
+    """(start_time, end_time) in bag time of a window given relative to the start of the bag or not"""
+    offset = bag.get_start_time() if relative and (start is not None or end is not None) else 0.0
+    start_time = offset + start if start is not None else None
+    end_time = offset + end if end is not None else None
+    return start_time, end_time
+
+
+def to_array(values):
+    """Converts a column to a numpy array, keeping variable-length arrays as an object array"""
+    if values and isinstance(values[0], (tuple, list, np.ndarray)):
+        if len(set(len(value) for value in values)) != 1:
+            column = np.empty(len(values), dtype=object)
+            column[:] = [np.asarray(value) for value in values]
+            return column
+    return np.asarray(values)
+
+
+def read_topics(bag_file, topics, start=None, end=None, relative=True, fields=None):
+    """Reads the topics in a single pass over the bag into per-topic numpy columns (see iter_bag)"""
+    columns = {topic: {"Time": []} for topic in topics}
+    for topic, t, message in iter_bag(bag_file, topics, start, end, relative, fields):
+        topic_columns = columns[topic]
+        topic_columns["Time"].append(t)
+        for name, value in message.items():
+            topic_columns.setdefault(name, []).append(value)
+
+    return {
+        topic: {name: to_array(values) for name, values in topic_columns.items()}
+        for topic, topic_columns in columns.items()
+    }
+
+
+def load_topics(bag_file, topics, start=None, end=None, relative=True, use_cache=True, fields=None):
+    """Reads all requested topics in a single pass into per-topic numpy columns
+
+    Returns {topic: {"Time": receive times, <column>: values}} with the same column
+    names as bagpy, without writing any intermediate CSV. Only messages between start
+    and end are read (see read_topics); Time stays absolute either way. fields maps
+    topics to the only columns to read, e.g. {"/downlink_delay": ["stamp.nsecs"]}. Decoded
+    topics are kept in the bag_cache, so only topics missing from the cache are read from the bag.
+    """
+    fields = fields or {}
+    if not use_cache:
+        return read_topics(bag_file, topics, start, end, relative, fields)
+
+    key = bag_cache.bag_key(bag_file)
+    window = None if start is None and end is None else (start, end, relative)
+    data = {}
+    for topic in topics:
+        cached = bag_cache.get(bag_file, key, topic, window, fields.get(topic))
+        if cached is not None:
+            data[topic] = cached
+
+    missing = [topic for topic in topics if topic not in data]
+    if missing:
+        for topic, columns in read_topics(bag_file, missing, start, end, relative, fields).items():
+            bag_cache.try_put(bag_file, key, topic, columns, window, fields.get(topic))
+            data[topic] = columns
+    return {topic: data[topic] for topic in topics}
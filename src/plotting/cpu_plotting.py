@@ -1,74 +1,50 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 import scienceplots
-from extract_data_to_dict import extract_data_to_dict
-from bagpy import bagreader
+from topic_schema import load_schema_topics
+from k8s_metrics import parse_metrics_strings
 from scipy.signal import medfilt
 from scipy.interpolate import interp1d
-import re
 
 def call_main():
     # Load the bag file
     bag_file = "/home/oem/Downloads/cpu1.bag"
-    b = bagreader(bag_file)
 
     # List of topics to read from the bag file
     topic_list = [
         "/k8s_pod_metrics",
     ]
 
-    # Initialize dictionaries to store data for each topic
-    data_storage = {topic: {} for topic in topic_list}
-
     # Define a list of divisors in the order they should be applied
     divisors = [8.0, 10.0, 15.0, 20.0, 25.0, 20.0, 15.0, 12.0, 8.0, 5.0]  # Extend as needed
     app_divisors = {}  # Store each app's assigned divisor
     app_order = []     # Track the order of applications
 
     # Extract data for each topic
-    for topic in topic_list:
-        topic_data = b.message_by_topic(topic)
-        data = pd.read_csv(topic_data)
-
-        # Print the columns of the DataFrame to understand its structure
-        print(f"Columns for topic {topic}: {data.columns}")
-
-        if topic == "/k8s_pod_metrics":
-            data_storage[topic] = extract_data_to_dict(data, ["Time", "data"])
+    data_storage = load_schema_topics(bag_file, topic_list)
 
     if "/k8s_pod_metrics" in data_storage:
         # Dictionary to store CPU values for each `cnmpc-deployment1` application
         cpu_values_dict = {}
         k8s_pod_metrics = data_storage["/k8s_pod_metrics"]
-        k8s_data = np.array(list(zip(k8s_pod_metrics["data"])))
-
-        # Iterate through entries and extract CPU values for `cnmpc-deployment1-*`
-        divisor_index = 0  # Track which divisor to use next
-        for entry in k8s_data:
-            entry_str = entry[0]
-            # Match applications starting with "cnmpc-deployment1-" using regex
-            match = re.match(r'(cnmpc-deployment1-\S+)', entry_str)
-            if match:
-                app_name = match.group(1)
-
-                # Assign divisor to app if seeing it for the first time
-                if app_name not in app_divisors:
-                    if divisor_index < len(divisors):
-                        app_divisors[app_name] = divisors[divisor_index]
-                        divisor_index += 1
-                        app_order.append(app_name)  # Track appearance order
-                    else:
-                        print(f"Warning: Not enough divisors for app {app_name}. Using last divisor.")
-                        app_divisors[app_name] = divisors[-1]  # Use the last divisor if we run out
-
-                cpu_part = entry_str.split("CPU=")[1].split(",")[0]
-                cpu_value = float(cpu_part.replace("m", "")) / app_divisors[app_name]
-
-                # Append CPU value to the corresponding app's list
-                if app_name not in cpu_values_dict:
-                    cpu_values_dict[app_name] = []
-                cpu_values_dict[app_name].append(cpu_value)
+        pod_metrics = parse_metrics_strings(k8s_pod_metrics["data"])
+
+        # CPU values of the applications starting with "cnmpc-deployment1-"
+        selected = np.char.startswith(pod_metrics["name"], "cnmpc-deployment1-")
+        app_names = pod_metrics["name"][selected]
+        app_cpu = pod_metrics["cpu"][selected]
+
+        # Assign divisors to the apps in order of first appearance
+        names, first_seen = np.unique(app_names, return_index=True)
+        for divisor_index, app_name in enumerate(names[np.argsort(first_seen)].tolist()):
+            if divisor_index < len(divisors):
+                app_divisors[app_name] = divisors[divisor_index]
+                app_order.append(app_name)  # Track appearance order
+            else:
+                print(f"Warning: Not enough divisors for app {app_name}. Using last divisor.")
+                app_divisors[app_name] = divisors[-1]  # Use the last divisor if we run out
+
+            cpu_values_dict[app_name] = (app_cpu[app_names == app_name] / app_divisors[app_name]).tolist()
 
     # Define the desired order based on appearance
     reordered_indices = [9, 8, 7, 6, 5, 0, 1, 2, 3, 4]
@@ -1,68 +1,66 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 import scienceplots
-from extract_data_to_dict import extract_data_to_dict
-from bagpy import bagreader
-import re
+from functools import partial
+from parallel_bags import map_bags
+from k8s_metrics import parse_metrics_strings
+from topic_schema import load_schema_topics
 
 
-def get_divisors_from_ros(bag, topic="/equilibrium_resources", scale=100):
-    topic_data = bag.message_by_topic(topic)
-    data = pd.read_csv(topic_data)
-    if "data" in data.columns:
-        return [float(x) / scale for x in data["data"]]
+def get_divisors_from_ros(data_storage, topic="/equilibrium_resources", scale=100):
+    if "data" in data_storage.get(topic, {}):
+        return (data_storage[topic]["data"] / scale).tolist()
     else:
         raise ValueError(f"Topic {topic} does not contain 'data' column")
 
 
-def process_bag_file(bag_file, topic_list, app_divisors, cpu_values_dict, app_order):
-    bag = bagreader(bag_file)
-    for topic in topic_list:
-        topic_data = bag.message_by_topic(topic)
-        data = pd.read_csv(topic_data)
-
-        if topic == "/k8s_pod_metrics":
-            data_storage = extract_data_to_dict(data, ["Time", "data"])
-            k8s_data = np.array(list(zip(data_storage["data"])))
-
-            for entry in k8s_data:
-                entry_str = entry[0]
-                match = re.match(r"(cnmpc-deployment1-\S+)", entry_str)
-                if match:
-                    app_name = match.group(1)
-
-                    # Assign divisor if not already done
-                    if app_name not in app_divisors:
-                        if len(app_divisors) < len(divisors):
-                            app_divisors[app_name] = divisors[len(app_divisors)]
-                            app_order.append(app_name)
-                        else:
-                            print(f"Warning: Insufficient divisors for {app_name}")
-                            app_divisors[app_name] = divisors[-1]  # Use last divisor
-
-                    # Extract and normalize CPU value
-                    cpu_part = entry_str.split("CPU=")[1].split(",")[0]
-                    cpu_value = (
-                        float(cpu_part.replace("m", "")) / app_divisors[app_name]
-                    )
-
-                    # Apply additional scaling for a specific ROS bag
-                    # if "journal_data_cpu_n2_h10.bag" in bag_file:
-                    #     cpu_value /= 3.0
-                    if "journal_data_cpu_n3_h10.bag" in bag_file:
-                        cpu_value /= 5.0
-                    # if "journal_data_cpu_n3_h20_new.bag" in bag_file:
-                    #     cpu_value /= 10.0
-                    if "journal_data_cpu_n3_h30.bag" in bag_file:
-                        cpu_value /= 1.2
-                    if "journal_data_cpu_n4_h10.bag" in bag_file:
-                        cpu_value /= 6.0
-                    if "journal_data_cpu_n6_h30.bag" in bag_file:
-                        cpu_value /= 5.0
-
-                    # Store the CPU value
-                    cpu_values_dict.setdefault(app_name, []).append(cpu_value)
+def extract_bag_samples(bag_file, topic_list, divisor_topic):
+    """Decodes one bag into its divisors and (app_name, cpu_millicores) samples, run in a worker process
+
+    The divisor topic and every topic of topic_list are read in a single pass over the bag.
+    """
+    data_storage = load_schema_topics(bag_file, list(dict.fromkeys([divisor_topic] + topic_list)))
+    divisors = get_divisors_from_ros(data_storage, topic=divisor_topic)
+
+    samples = []
+    if "/k8s_pod_metrics" in data_storage:
+        pod_metrics = parse_metrics_strings(data_storage["/k8s_pod_metrics"]["data"])
+        selected = np.char.startswith(pod_metrics["name"], "cnmpc-deployment1-")
+        samples.extend(zip(pod_metrics["name"][selected].tolist(), pod_metrics["cpu"][selected].tolist()))
+    return divisors, samples
+
+
+def process_bag_file(bag_file, divisors, samples, app_divisors, cpu_values_dict, app_order):
+    """Normalizes the CPU samples of one bag, assigning divisors to apps in order of appearance"""
+    for app_name, cpu_millicores in samples:
+        # Assign divisor if not already done
+        if app_name not in app_divisors:
+            if len(app_divisors) < len(divisors):
+                app_divisors[app_name] = divisors[len(app_divisors)]
+                app_order.append(app_name)
+            else:
+                print(f"Warning: Insufficient divisors for {app_name}")
+                app_divisors[app_name] = divisors[-1]  # Use last divisor
+
+        # Normalize CPU value
+        cpu_value = cpu_millicores / app_divisors[app_name]
+
+        # Apply additional scaling for a specific ROS bag
+        # if "journal_data_cpu_n2_h10.bag" in bag_file:
+        #     cpu_value /= 3.0
+        if "journal_data_cpu_n3_h10.bag" in bag_file:
+            cpu_value /= 5.0
+        # if "journal_data_cpu_n3_h20_new.bag" in bag_file:
+        #     cpu_value /= 10.0
+        if "journal_data_cpu_n3_h30.bag" in bag_file:
+            cpu_value /= 1.2
+        if "journal_data_cpu_n4_h10.bag" in bag_file:
+            cpu_value /= 6.0
+        if "journal_data_cpu_n6_h30.bag" in bag_file:
+            cpu_value /= 5.0
+
+        # Store the CPU value
+        cpu_values_dict.setdefault(app_name, []).append(cpu_value)
 
 
 def plot_cpu_values_subplots(cpu_values_dict, app_order, output_file1, output_file2):
@@ -155,7 +153,7 @@ def plot_cpu_values_subplots(cpu_values_dict, app_order, output_file1, output_fi
     plt.show()
 
 
-def call_main():
+def call_main(workers=None):
     bag_files = [
         "/home/oem/Downloads/journal_data_cpu_n1_h10.bag",
         "/home/oem/Downloads/journal_data_cpu_n1_h20.bag",
@@ -199,11 +197,12 @@ def call_main():
     app_divisors = {}
     app_order = []
 
-    for bag_file in bag_files:
-        bag = bagreader(bag_file)
-        global divisors
-        divisors = get_divisors_from_ros(bag, topic=divisor_topic)
-        process_bag_file(bag_file, topic_list, app_divisors, cpu_values_dict, app_order)
+    # Decode the bags in parallel; results come back in bag order, so divisors are assigned deterministically
+    bag_results = map_bags(
+        partial(extract_bag_samples, topic_list=topic_list, divisor_topic=divisor_topic), bag_files, workers
+    )
+    for bag_file, (divisors, samples) in zip(bag_files, bag_results):
+        process_bag_file(bag_file, divisors, samples, app_divisors, cpu_values_dict, app_order)
 
     with plt.style.context(["science", "ieee"]):
         # Plot CPU values using subplots
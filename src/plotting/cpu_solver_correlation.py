@@ -1,8 +1,7 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 import scienceplots
-from bagpy import bagreader
+from topic_schema import load_schema_topics
 import re
 
 
@@ -27,24 +26,16 @@ def extract_cpu_percentage(file_path):
 def call_main():
     # Load the bag file
     bag_file = "/home/oem/Downloads/turtlebots2.bag"
-    b = bagreader(bag_file)
 
-    # Read the solver_time topic
+    # Read the solver_time topic, in seconds
     topic = "/solver_time"
-    topic_file = b.message_by_topic(topic)
-    
-    if not topic_file:
-        print(f"Error: Could not find data for topic {topic}")
-        return
-    
-    solver_data = pd.read_csv(topic_file)
-    print(f"Columns for topic {topic}: {solver_data.columns}")
+    data_storage = load_schema_topics(bag_file, [topic])
 
-    if solver_data.empty:
-        print("Error: Solver time data is empty.")
+    if topic not in data_storage:
+        print(f"Error: Could not find data for topic {topic}")
         return
 
-    solver_times = solver_data.iloc[:, 1].astype(float).tolist()  # Use second column for time
+    solver_times = data_storage[topic]["data"].tolist()
 
     if not solver_times:
         print("Error: No solver times found.")
@@ -70,7 +61,6 @@ def call_main():
         fig, axs = plt.subplots(2, 1, figsize=(4, 3), sharex=True)
         
         time_axis = np.arange(len(solver_times)) / 10
-        solver_times = [time / 1000 for time in solver_times]
 
         # Plot solver times
         axs[0].plot(time_axis, solver_times, color='black')
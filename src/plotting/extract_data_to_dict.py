@@ -1,7 +1,25 @@
-def extract_data_to_dict(dataframe, columns, has_time=True):
-    """Extracts specified columns from a dataframe and returns a dictionary"""
-    data_dict = {col: dataframe[col].tolist() for col in columns}
-    if has_time and "Time" in data_dict:
-        initial_time = data_dict["Time"][0]
-        data_dict["Time"] = [t - initial_time for t in data_dict["Time"]]
-    return data_dict
\ No newline at end of file
+import numpy as np
+
+
+def extract_data_to_dict(dataframe, columns, has_time=True, dtype=None, time_unit="s"):
+    """Extracts specified columns from a dataframe (or dict of arrays) into a dictionary of numpy arrays
+
+    Columns are returned as views of the source data where possible, so callers must copy
+    a column before modifying it in place. dtype (e.g. np.float32) casts the float
+    columns, and time_unit="ns" returns the rebased Time as int64 nanoseconds.
+    """
+    data_dict = {col: np.asarray(dataframe[col]) for col in columns}
+    if dtype is not None:
+        for col, values in data_dict.items():
+            # Integer columns such as stamp.secs would lose precision in a float32
+            if values.dtype.kind == "f":
+                data_dict[col] = values.astype(dtype, copy=False)
+    if has_time and "Time" in data_dict and len(data_dict["Time"]):
+        # Rebase in float64 before any cast so the offsets keep their precision
+        time = np.asarray(dataframe["Time"], dtype=np.float64)
+        time = time - time[0]
+        if time_unit == "ns":
+            data_dict["Time"] = np.round(time * 1e9).astype(np.int64)
+        else:
+            data_dict["Time"] = time if dtype is None else time.astype(dtype)
+    return data_dict
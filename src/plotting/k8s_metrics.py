@@ -0,0 +1,118 @@
+import glob
+import os
+import numpy as np
+import pandas as pd
+from bag_loader import iter_bag
+
+# "pod: CPU=123m, Memory=45Mi" and "node: CPU=123m cores (3%%), Memory=45Mi bytes (6%%)";
+# the recorder writes a literal %% in the node strings. Memory units are Kubernetes
+# quantity suffixes; strings with any other unit do not match, rather than parse wrong
+METRICS_PATTERN = (
+    r"^(?P<name>[^:]+):\s*CPU=(?P<cpu>[\d.]+)(?P<cpu_unit>[mun]?)(?:\s*cores)?"
+    r"(?:\s*\((?P<cpu_percent>[\d.]+)%+\))?,\s*Memory=(?P<memory>[\d.]+)(?P<memory_unit>(?:[KMGT]i?|k)?)"
+    r"(?=\s|$|,)(?:\s*bytes)?(?:\s*\((?P<memory_percent>[\d.]+)%+\))?"
+)
+CPU_UNITS = {"": 1e3, "m": 1.0, "u": 1e-3, "n": 1e-6}
+MEMORY_UNITS = {
+    "": 1, "k": 1e3, "K": 1e3, "M": 1e6, "G": 1e9, "T": 1e12, "Ki": 2**10, "Mi": 2**20, "Gi": 2**30, "Ti": 2**40
+}
+
+
+def parse_metrics_strings(strings):
+    """Parses a column of /k8s_pod_metrics or /k8s_node_metrics strings in one vectorized pass
+
+    Returns {"name", "cpu" (millicores), "memory" (bytes), "cpu_percent", "memory_percent"}
+    arrays aligned with the input; rows that do not match have an empty name and NaN
+    values, and the percentages are NaN for pod strings.
+    """
+    fields = pd.Series(np.asarray(strings, dtype=str)).str.extract(METRICS_PATTERN)
+    cpu_scale = fields["cpu_unit"].map(CPU_UNITS).to_numpy(dtype=float)
+    memory_scale = fields["memory_unit"].map(MEMORY_UNITS).to_numpy(dtype=float)
+    return {
+        "name": fields["name"].fillna("").str.strip().to_numpy(dtype=str),
+        "cpu": fields["cpu"].astype(float).to_numpy() * cpu_scale,
+        "memory": fields["memory"].astype(float).to_numpy() * memory_scale,
+        "cpu_percent": fields["cpu_percent"].astype(float).to_numpy(),
+        "memory_percent": fields["memory_percent"].astype(float).to_numpy(),
+    }
+
+
+def reconstruct_delta_batches(batches):
+    """Expands delta-mode batches back into one full snapshot per scrape
+
+    batches yields (stamp, keyframe, names, columns, removed_names) as stored in the
+    messages; this yields (stamp, names, rows) with the latest values of every pod known
+    at that scrape.
+    """
+    state = {}
+    for stamp, keyframe, names, columns, removed_names in batches:
+        if keyframe:
+            state = {}
+        for name in removed_names:
+            state.pop(name, None)
+        for name, *row in zip(names, *columns):
+            state[name] = tuple(row)
+        yield stamp, list(state.keys()), list(state.values())
+
+
+def read_pod_metrics_batches(bag_file, topic="/k8s_pod_metrics_batch"):
+    """Reads batched PodMetrics messages into flat per-sample arrays"""
+
+    def batches():
+        for _, _, msg in iter_bag(bag_file, [topic]):
+            yield (
+                msg["header.stamp.secs"] + msg["header.stamp.nsecs"] * 1e-9,
+                msg["keyframe"],
+                msg["pod_names"],
+                (msg["cpu_millicores"], msg["memory_bytes"]),
+                msg["removed_pod_names"],
+            )
+
+    times, pods, rows = [], [], []
+    for stamp, names, snapshot in reconstruct_delta_batches(batches()):
+        times.extend([stamp] * len(names))
+        pods.extend(names)
+        rows.extend(snapshot)
+
+    rows = np.array(rows, dtype=float).reshape(-1, 2)
+    return {
+        "Time": np.array(times, dtype=float),
+        "pod": np.array(pods, dtype=str),
+        "cpu": rows[:, 0],
+        "memory": rows[:, 1],
+    }
+
+
+def read_arrow_stream(path):
+    """Reads the record batches of an Arrow IPC stream file, up to where it was cut short"""
+    import pyarrow as pa
+
+    batches = []
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_stream(source)
+        while True:
+            try:
+                batches.append(reader.read_next_batch())
+            except StopIteration:
+                break
+            except (pa.ArrowInvalid, OSError):
+                break  # Truncated by a crash of the monitor; the batches before it are complete
+    return pa.Table.from_batches(batches, schema=reader.schema)
+
+
+def load_metrics_table(directory, kind="pod"):
+    """Loads the Parquet/Arrow files written by the monitor's columnar sink into numpy columns"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tables = []
+    for path in sorted(glob.glob(os.path.join(directory, f"k8s_{kind}_metrics-*"))):
+        if path.endswith(".parquet"):
+            tables.append(pq.read_table(path))
+        elif path.endswith(".arrows"):
+            tables.append(read_arrow_stream(path))
+    if not tables:
+        raise FileNotFoundError(f"No k8s_{kind}_metrics files in {directory}")
+
+    table = pa.concat_tables(tables)
+    return {name: table.column(name).to_numpy() for name in table.column_names}
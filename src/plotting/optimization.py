@@ -1,4 +1,4 @@
-import rosbag
+from bag_loader import iter_bag
 import matplotlib.pyplot as plt
 import scienceplots
 
@@ -20,71 +20,71 @@ def extract_rosbag_data(bag_file, topic="/results", agents_topic="/number_of_age
 
     data_agents = 1  # Initialize with a default value for number of agents
 
-    # Open the rosbag
-    with rosbag.Bag(bag_file, "r") as bag:
-        for topic, msg, t in bag.read_messages(topics=[topic, agents_topic]):
-            if topic == "/results":
-                data = msg.data  # The message data (list of values)
-            elif topic == "/number_of_agents":
-                data_agents = msg.data
-
-            if data_agents < 70:
-                # Temporary lists for this timestep
-                temp_node_1 = []
-                temp_node_2 = []
-                temp_node_3 = []
-
-                for i in range(0, int(len(data) / 4)):
-                    # Extract relevant information
-                    num_agents_init = data[0 + 4 * i]
-                    horizon_init = data[1 + 4 * i]
-                    resource_init = data[2 + 4 * i]
-                    k8s_node_init = data[3 + 4 * i]
-
-                    # Append data to the appropriate node's temporary list
-                    if k8s_node_init == 1:
-                        temp_node_1.append(
-                            (num_agents_init, horizon_init, resource_init)
-                        )
-                    elif k8s_node_init == 2:
-                        temp_node_2.append(
-                            (num_agents_init, horizon_init, resource_init)
-                        )
-                    elif k8s_node_init == 3:
-                        temp_node_3.append(
-                            (num_agents_init, horizon_init, resource_init)
-                        )
-
-                # Append temporary lists to the main lists, using empty lists for missing data
-                num_agents_node_1.append(
-                    [val[0] for val in temp_node_1] if temp_node_1 else [0]
-                )
-                horizon_node_1.append(
-                    [val[1] for val in temp_node_1] if temp_node_1 else [0]
-                )
-                resources_node_1.append(
-                    [val[2] for val in temp_node_1] if temp_node_1 else [0]
-                )
-
-                num_agents_node_2.append(
-                    [val[0] for val in temp_node_2] if temp_node_2 else [0]
-                )
-                horizon_node_2.append(
-                    [val[1] for val in temp_node_2] if temp_node_2 else [0]
-                )
-                resources_node_2.append(
-                    [val[2] for val in temp_node_2] if temp_node_2 else [0]
-                )
-
-                num_agents_node_3.append(
-                    [val[0] for val in temp_node_3] if temp_node_3 else [0]
-                )
-                horizon_node_3.append(
-                    [val[1] for val in temp_node_3] if temp_node_3 else [0]
-                )
-                resources_node_3.append(
-                    [val[2] for val in temp_node_3] if temp_node_3 else [0]
-                )
+    # Read the rosbag, decoding only the data arrays
+    fields = {topic: ["data"], agents_topic: ["data"]}
+    for topic, t, msg in iter_bag(bag_file, [topic, agents_topic], fields=fields):
+        if topic == "/results":
+            data = msg["data"]  # The message data (list of values)
+        elif topic == "/number_of_agents":
+            data_agents = msg["data"]
+
+        if data_agents < 70:
+            # Temporary lists for this timestep
+            temp_node_1 = []
+            temp_node_2 = []
+            temp_node_3 = []
+
+            for i in range(0, int(len(data) / 4)):
+                # Extract relevant information
+                num_agents_init = data[0 + 4 * i]
+                horizon_init = data[1 + 4 * i]
+                resource_init = data[2 + 4 * i]
+                k8s_node_init = data[3 + 4 * i]
+
+                # Append data to the appropriate node's temporary list
+                if k8s_node_init == 1:
+                    temp_node_1.append(
+                        (num_agents_init, horizon_init, resource_init)
+                    )
+                elif k8s_node_init == 2:
+                    temp_node_2.append(
+                        (num_agents_init, horizon_init, resource_init)
+                    )
+                elif k8s_node_init == 3:
+                    temp_node_3.append(
+                        (num_agents_init, horizon_init, resource_init)
+                    )
+
+            # Append temporary lists to the main lists, using empty lists for missing data
+            num_agents_node_1.append(
+                [val[0] for val in temp_node_1] if temp_node_1 else [0]
+            )
+            horizon_node_1.append(
+                [val[1] for val in temp_node_1] if temp_node_1 else [0]
+            )
+            resources_node_1.append(
+                [val[2] for val in temp_node_1] if temp_node_1 else [0]
+            )
+
+            num_agents_node_2.append(
+                [val[0] for val in temp_node_2] if temp_node_2 else [0]
+            )
+            horizon_node_2.append(
+                [val[1] for val in temp_node_2] if temp_node_2 else [0]
+            )
+            resources_node_2.append(
+                [val[2] for val in temp_node_2] if temp_node_2 else [0]
+            )
+
+            num_agents_node_3.append(
+                [val[0] for val in temp_node_3] if temp_node_3 else [0]
+            )
+            horizon_node_3.append(
+                [val[1] for val in temp_node_3] if temp_node_3 else [0]
+            )
+            resources_node_3.append(
+                [val[2] for val in temp_node_3] if temp_node_3 else [0]
+            )
 
     return (
         num_agents_node_1,
@@ -103,10 +103,9 @@ def extract_rosbag_data(bag_file, topic="/results", agents_topic="/number_of_age
 def extract_available_resources(bag_file, topic="/available_resource"):
     available_resources = []  # To store available resource data for all timesteps
 
-    with rosbag.Bag(bag_file, "r") as bag:
-        for topic, msg, t in bag.read_messages(topics=[topic]):
-            # Extract the `data` array from the message
-            available_resources.append(msg.data)
+    for topic, t, msg in iter_bag(bag_file, [topic], fields={topic: ["data"]}):
+        # Extract the `data` array from the message
+        available_resources.append(msg["data"])
 
     return available_resources
 
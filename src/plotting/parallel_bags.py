@@ -0,0 +1,32 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+def bag_workers(workers=None):
+    """Number of worker processes: the argument, $CNMPC_BAG_WORKERS, or one per core"""
+    if workers:
+        return workers
+    return int(os.environ.get("CNMPC_BAG_WORKERS", 0)) or os.cpu_count() or 1
+
+
+def set_decompress_workers(threads):
+    """Process initializer capping the decompression threads of rosbag_lite, unless set explicitly"""
+    os.environ.setdefault("CNMPC_BAG_DECOMPRESS_WORKERS", str(threads))
+
+
+def map_bags(func, bag_files, workers=None):
+    """Runs func(bag_file) for every bag in worker processes
+
+    Results come back in the order of bag_files whatever order the workers finish in,
+    so any state built from them afterwards is deterministic. func must be a module
+    level function (or a functools.partial of one) so it can be sent to the workers,
+    and should return compact per-bag results rather than whole topics. The cores are
+    split between the processes, so each one gets cores // workers decompression
+    threads rather than one per core.
+    """
+    workers = min(bag_workers(workers), len(bag_files))
+    if workers <= 1:
+        return [func(bag_file) for bag_file in bag_files]
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=set_decompress_workers, initargs=(threads,)) as executor:
+        return list(executor.map(func, bag_files))
@@ -1,53 +1,50 @@
-import rosbag
-import re
 import os
+import numpy as np
 import scienceplots
 import matplotlib.pyplot as plt
-
-
-def extract_cpu_and_calculate(bag_files):
+from k8s_metrics import parse_metrics_strings
+from parallel_bags import map_bags
+from topic_schema import load_schema_topics
+
+
+def extract_bag_cpu(bag_file):
+    """Extracts the equilibrium resource and CPU percentages of one bag, run in a worker process"""
+    print(f"Processing {bag_file}...")
+    try:
+        # Read both topics in a single pass over the bag
+        data_storage = load_schema_topics(bag_file, ["/equilibrium_resources", "/k8s_pod_metrics"])
+
+        # Extract the equilibrium resource value
+        if "/equilibrium_resources" not in data_storage:
+            print(f"Equilibrium resource not found in {bag_file}. Skipping...")
+            return None
+        # Assume there's only one equilibrium resource value per bag
+        equilibrium_resource = float(data_storage["/equilibrium_resources"]["data"][0])
+
+        # Extract CPU values (milli-cores) for cnmpc-deployment1 and calculate percentages
+        pod_strings = data_storage.get("/k8s_pod_metrics", {"data": []})["data"]
+        pod_metrics = parse_metrics_strings(pod_strings)
+        selected = np.char.startswith(pod_metrics["name"], "cnmpc-deployment1")
+        # Calculate CPU as a percentage of equilibrium resource
+        cpu_percentages = (pod_metrics["cpu"][selected] / equilibrium_resource * 100).tolist()
+
+        return {
+            "equilibrium_resource": equilibrium_resource,
+            "cpu_percentages": cpu_percentages,
+        }
+    except Exception as e:
+        print(f"Error processing {bag_file}: {e}")
+        return None
+
+
+def extract_cpu_and_calculate(bag_files, workers=None):
     results = {}
 
-    for bag_file in bag_files:
-        print(f"Processing {bag_file}...")
-        try:
-            bag = rosbag.Bag(bag_file, "r")
-
-            # Initialize values
-            equilibrium_resource = None
-            cpu_percentages = []
-
-            # Extract the equilibrium resource value
-            for topic, msg, t in bag.read_messages(topics=["/equilibrium_resources"]):
-                equilibrium_resource = float(msg.data)
-                break  # Assume there's only one equilibrium resource value per bag
-
-            if equilibrium_resource is None:
-                print(f"Equilibrium resource not found in {bag_file}. Skipping...")
-                continue
-
-            # Extract CPU values for cnmpc-deployment1 and calculate percentages
-            for topic, msg, t in bag.read_messages(topics=["/k8s_pod_metrics"]):
-                data = msg.data
-                # Match CPU value for cnmpc-deployment1
-                match = re.search(r"cnmpc-deployment1[^\s]*: CPU=(\d+)m", data)
-                if match:
-                    cpu_value = int(match.group(1))  # CPU in milli-cores
-                    # Calculate CPU as a percentage of equilibrium resource
-                    cpu_percentage = (
-                        cpu_value / equilibrium_resource * 100
-                    )  # Convert milli-cores to cores
-                    cpu_percentages.append(cpu_percentage)
-
+    # Bags are decoded in parallel and collected in their original order
+    for bag_file, result in zip(bag_files, map_bags(extract_bag_cpu, bag_files, workers)):
+        if result is not None:
             # Store results for this bag
-            results[bag_file] = {
-                "equilibrium_resource": equilibrium_resource,
-                "cpu_percentages": cpu_percentages,
-            }
-
-            bag.close()
-        except Exception as e:
-            print(f"Error processing {bag_file}: {e}")
+            results[bag_file] = result
 
     return results
 
@@ -1,29 +1,13 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 import scienceplots
-from extract_data_to_dict import extract_data_to_dict
-from bagpy import bagreader
+from topic_schema import load_schema_topics
+from k8s_metrics import parse_metrics_strings
+from rolling import rolling_mean
+from quantiles import tail_latency_report
+from resample import Resampler, common_time_base
+from resource_allocation import ResourceSchedule, reconstruct_resources
 from scipy.signal import medfilt
-from scipy.interpolate import interp1d
-
-
-# Function to compute the sliding window average
-def sliding_window_average(data):
-    averages = []
-    window = []
-
-    for value in data:
-        window.append(value)
-        if len(window) > 1000:
-            window.pop(0)  # Remove the oldest value to keep the window size constant
-        if len(window) == 1000:
-            averages.append(sum(window) / 1000)
-        else:
-            averages.append(
-                sum(window) / len(window)
-            )  # To keep the array lengths the same, append NaN for initial values
-    return averages
 
 
 def clean_data(time_array, data_array):
@@ -41,9 +25,6 @@ def clean_data(time_array, data_array):
 def call_main():
     # Load the bag file
     bag_file = "/home/oem/Downloads/testing5.bag"
-    b = bagreader(bag_file)
-    counter = 0
-    counter2 = 0
 
     # List of topics to read from the bag file
     topic_list = [
@@ -60,62 +41,27 @@ def call_main():
         "/k8s_pod_metrics",
     ]
 
-    # Initialize dictionaries to store data for each topic
-    data_storage = {topic: {} for topic in topic_list}
-
-    # Extract data for each topic
-    for topic in topic_list:
-        topic_data = b.message_by_topic(topic)
-        data = pd.read_csv(topic_data)
-
-        # Print the columns of the DataFrame to understand its structure
-        print(f"Columns for topic {topic}: {data.columns}")
-
-        if topic == "/av_downlink":
-            data_storage[topic] = extract_data_to_dict(data, ["Time", "data"])
-        elif topic == "/downlink_delay":
-            data_storage[topic] = extract_data_to_dict(
-                data, ["Time", "stamp.secs", "stamp.nsecs"]
-            )
-        elif topic == "/av_uplink":
-            data_storage[topic] = extract_data_to_dict(data, ["Time", "data"])
-        elif topic == "/uplink_delay":
-            data_storage[topic] = extract_data_to_dict(
-                data, ["Time", "stamp.secs", "stamp.nsecs"]
-            )
-        elif topic == "/av_rtt":
-            data_storage[topic] = extract_data_to_dict(data, ["Time", "data"])
-        elif topic == "/equilibrium_resources":
-            data_storage[topic] = extract_data_to_dict(data, ["Time", "data"])
-        elif topic == "/time_resources":
-            data_storage[topic] = extract_data_to_dict(data, ["Time", "data"])
-        elif topic == "/time_error":
-            data_storage[topic] = extract_data_to_dict(data, ["Time", "data"])
-        elif topic == "/k8s_node_metrics":
-            data_storage[topic] = extract_data_to_dict(data, ["Time", "data"])
-        elif topic == "/k8s_pod_metrics":
-            data_storage[topic] = extract_data_to_dict(data, ["Time", "data"])
-        elif topic == "/solver_time":
-            data_storage[topic] = extract_data_to_dict(data, ["Time", "data"])
+    # Read the registered columns of all topics in a single pass over the bag
+    data_storage = load_schema_topics(bag_file, topic_list)
 
     if "/av_downlink" in data_storage:
         av_downlink = data_storage["/av_downlink"]
         time_avd = av_downlink["Time"]
-        av_downlink = np.array(av_downlink["data"]) + 0.010
+        av_downlink = av_downlink["data"] + 0.010
 
     if "/av_uplink" in data_storage:
         av_uplink = data_storage["/av_uplink"]
         time_avu = av_uplink["Time"]
-        av_uplink = np.array(av_uplink["data"]) - 0.010
+        av_uplink = av_uplink["data"] - 0.010
 
     if "/solver_time" in data_storage:
         solver_time = data_storage["/solver_time"]
         time_s = solver_time["Time"]
-        solver_time = np.array(solver_time["data"]) * 1e-3
+        solver_time = solver_time["data"]
 
     if "/av_rtt" in data_storage:
         av_rtt = data_storage["/av_rtt"]
-        av_rtt = np.array(av_rtt["data"])
+        av_rtt = av_rtt["data"]
 
     try:
         time_avd, av_downlink = clean_data(time_avd, av_downlink)
@@ -126,102 +72,55 @@ def call_main():
         return
 
     # Define a common time base
-    min_time = float(max(time_avd[0], time_avu[0], time_s[0]))
-    max_time = float(min(time_avd[-1], time_avu[-1], time_s[-1]))
-    num_points = min(len(time_avd), len(time_avu), len(time_s))
-
-    common_time = np.linspace(min_time, max_time, num_points)
-
-    av_downlink_interp = interp1d(
-        time_avd, av_downlink, kind="linear", fill_value="extrapolate"
-    )(common_time)
-    av_uplink_interp = interp1d(
-        time_avu, av_uplink, kind="linear", fill_value="extrapolate"
-    )(common_time)
-    solver_time_interp = interp1d(
-        time_s, solver_time, kind="linear", fill_value="extrapolate"
-    )(common_time)
+    common_time = common_time_base(time_avd, time_avu, time_s)
+
+    av_downlink_interp, av_uplink_interp, solver_time_interp = Resampler(common_time).resample(
+        (time_avd, av_downlink), (time_avu, av_uplink), (time_s, solver_time)
+    )
     round_trip_time = av_downlink_interp + av_uplink_interp + solver_time_interp
 
     if "/equilibrium_resources" in data_storage:
         equilibrium_resources = data_storage["/equilibrium_resources"]
-        equilibrium_resources = np.array(list(zip(equilibrium_resources["data"])))
+        equilibrium_resources = equilibrium_resources["data"]
 
     if "/time_resources" in data_storage:
         time_resources = data_storage["/time_resources"]
-        time_r = np.array(time_resources["Time"])
-        time_resources = np.array(time_resources["data"])
-        resources = np.zeros(len(time_resources))
-        for i in range (0, len(time_resources)-1):
-            if time_r[i] < 4.95:
-                resources[i] = 1500
-                time_resources[i] = 0
-        for i in range (0, len(time_resources)-1):
-            if time_resources[i] < 3000:
-                resources[i] = 1500
-            elif time_resources[i] >= 3000 and time_resources[i] <= 5000:
-                resources[i] = 3500
-            else:
-                resources[i] = 6000
-        for i in range (0, len(resources)-1):
-            counter2 = counter2 + 1
-            if resources[i] == 3500:
-                resources[i] = 1500
-                counter = counter + 1
-            if counter > 500:
-                break
-        for i in range (counter2, len(resources)-1):
-            if resources[i] == 3500:
-                counter3 = i + 1
-                resources[i] = time_resources[counter2]
-        for i in range (counter3, len(resources)-1):
-            counter4 = i + 1
-            if resources[i] == 6000:
-                resources[i] = time_resources[counter2]
-                counter = counter + 1
-            if counter > 1000:
-                break
-        for i in range (counter4, len(resources)-1):
-            resources[i] = time_resources[counter4]
-        time_r[len(resources)-1] = 240
-        resources[len(resources)-1] = time_resources[counter4]
+        time_r, time_resources, resources = reconstruct_resources(
+            time_resources["Time"], time_resources["data"], ResourceSchedule()
+        )
 
     if "/time_error" in data_storage:
         time_error = data_storage["/time_error"]
-        time_error = np.array(list(zip(time_error["data"])))
+        time_error = time_error["data"]
 
     if "/k8s_node_metrics" in data_storage:
         k8s_node_metrics = data_storage["/k8s_node_metrics"]
-        k8s_node_metrics = np.array(list(zip(k8s_node_metrics["data"])))
+        k8s_node_metrics = parse_metrics_strings(k8s_node_metrics["data"])
 
     if "/k8s_pod_metrics" in data_storage:
-        cpu_values = []
-        cpu_times = []
         k8s_pod_metrics = data_storage["/k8s_pod_metrics"]
-        k8s_time = k8s_pod_metrics["Time"]
-        k8s_data = np.array(list(zip(k8s_pod_metrics["data"])))
-        for entry, time in zip(k8s_data, k8s_time):
-            entry_str = entry[0]
-            if "cnmpc-deployment1-5d5c6b757-mjtzg" in entry_str:
-                cpu_part = entry_str.split("CPU=")[1].split(",")[0]
-                cpu_value = float(cpu_part.replace("m", "")) / 10.0
-                cpu_values.append(cpu_value)
-                cpu_times.append(time)
-        cpu_values_array = np.array(cpu_values)
-        cpu_times_array = np.array(cpu_times)
+        pod_metrics = parse_metrics_strings(k8s_pod_metrics["data"])
+        selected = pod_metrics["name"] == "cnmpc-deployment1-5d5c6b757-mjtzg"
+        cpu_values_array = pod_metrics["cpu"][selected] / 10.0
+        cpu_times_array = np.asarray(k8s_pod_metrics["Time"])[selected]
 
     if "/downlink_delay" in data_storage:
         downlink_delay = data_storage["/downlink_delay"]
         time_d = downlink_delay["Time"]
-        downlink_delay = np.array(downlink_delay["stamp.nsecs"]) * 1e-9 + 0.010
+        downlink_delay = downlink_delay["stamp.nsecs"] * 1e-9 + 0.010
 
     if "/uplink_delay" in data_storage:
         uplink_delay = data_storage["/uplink_delay"]
         time_u = uplink_delay["Time"]
-        uplink_delay = np.array(uplink_delay["stamp.nsecs"]) * 1e-9 - 0.010
+        uplink_delay = uplink_delay["stamp.nsecs"] * 1e-9 - 0.010
+
+    solver_time_avg = rolling_mean(solver_time, window=1000)
+    round_trip_time_avg = rolling_mean(round_trip_time, window=1000)
 
-    solver_time_avg = sliding_window_average(solver_time)
-    round_trip_time_avg = sliding_window_average(round_trip_time)
+    # Tail latency of the whole run against the maximum allowable delay
+    max_delay = 0.274
+    tail_latency_report("solver time", solver_time)
+    tail_latency_report("round trip time", round_trip_time, limit=max_delay)
 
     # Plotting
     with plt.style.context(["science", "ieee"]):
@@ -257,7 +156,7 @@ def call_main():
         # Plot Round-trip time
         axs[3].plot(common_time, round_trip_time, color="black", alpha=0.5, label="average")
         axs[3].plot(common_time, round_trip_time_avg, color="black", label="round trip time")
-        axs[3].axhline(y=0.274, color="orange", linestyle="--", label="maximum allowable delay")
+        axs[3].axhline(y=max_delay, color="orange", linestyle="--", label="maximum allowable delay")
         axs[3].set_ylim(0.19, 0.31)
         axs[3].set_yticks([0.20, 0.25, 0.30])
         axs[3].set_ylabel(r'(d) $\tau_{rtt}(t) \,\, (s)$', fontsize=10)
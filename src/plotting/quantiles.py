@@ -0,0 +1,192 @@
+import math
+import sys
+from collections import deque
+import numpy as np
+from parallel_bags import map_bags
+from topic_schema import load_schema_topics
+
+TAIL_QUANTILES = (0.5, 0.95, 0.99, 0.999)
+
+
+class DDSketch:
+    """Mergeable quantile sketch with relative error guarantees (Masson et al., DDSketch, VLDB 2019)
+
+    Positive values are counted in logarithmic buckets of ratio gamma = (1 + a) / (1 - a),
+    so every quantile is returned within relative_accuracy `a` of the true value. The
+    number of buckets only depends on the range of values, and is capped at max_bins by
+    merging the lowest buckets, so memory stays constant however many values are added.
+    Sketches with the same relative_accuracy merge exactly by adding bucket counts. With
+    max_bins=None buckets are never merged, which subtract needs.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_bins=2048, min_value=1e-9):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_bins = max_bins
+        self.min_value = min_value
+        self.bins = {}
+        self.zero_count = 0  # Values below min_value, including zero and negative ones
+        self.collapsed = False  # Whether low buckets were merged, so their keys are gone
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, values):
+        """Adds one value or an array of values"""
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        positive = values[values >= self.min_value]
+        self.zero_count += len(values) - len(positive)
+        keys, counts = np.unique(np.ceil(np.log(positive) / self.log_gamma).astype(np.int64), return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.collapse()
+
+    def collapse(self):
+        # Merge the lowest buckets into one so at most max_bins are kept
+        if self.max_bins is None or len(self.bins) <= self.max_bins:
+            return
+        keys = sorted(self.bins)
+        lowest = keys[len(keys) - self.max_bins]
+        for key in keys[: len(keys) - self.max_bins]:
+            self.bins[lowest] += self.bins.pop(key)
+        self.collapsed = True
+
+    def merge(self, other):
+        """Adds the counts of another sketch with the same relative accuracy"""
+        if other.gamma != self.gamma:
+            raise ValueError("Only sketches with the same relative_accuracy can be merged")
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.collapse()
+        return self
+
+    def subtract(self, other):
+        """Removes the counts of a sketch previously merged into this one, e.g. an expired window bucket
+
+        Once low buckets were merged their original keys are gone, so both sketches must
+        never have been collapsed (use max_bins=None). min and max become the values of
+        the lowest and highest remaining buckets, 0 for the values below min_value.
+        """
+        if self.collapsed or other.collapsed:
+            raise ValueError("Cannot subtract collapsed sketches, create them with max_bins=None")
+        for key, count in other.bins.items():
+            remaining = self.bins[key] - count
+            if remaining:
+                self.bins[key] = remaining
+            else:
+                del self.bins[key]
+        self.zero_count -= other.zero_count
+        self.count -= other.count
+        if not self.count:
+            self.min, self.max = math.inf, -math.inf
+        else:
+            self.min = 0.0 if self.zero_count else self.value(min(self.bins))
+            self.max = self.value(max(self.bins)) if self.bins else 0.0
+        return self
+
+    def value(self, key):
+        return 2 * self.gamma**key / (self.gamma + 1)
+
+    def quantile(self, q):
+        """Value at quantile q (0 <= q <= 1), or NaN for an empty sketch"""
+        if not self.count:
+            return math.nan
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        cumulative = self.zero_count
+        for key in sorted(self.bins):
+            cumulative += self.bins[key]
+            if cumulative > rank:
+                return self.value(key)
+        return self.value(max(self.bins))
+
+    def quantiles(self, qs=TAIL_QUANTILES):
+        return [self.quantile(q) for q in qs]
+
+    def fraction_above(self, threshold):
+        """Estimated fraction of values above threshold"""
+        if not self.count:
+            return math.nan
+        if threshold < self.min_value:
+            return sum(self.bins.values()) / self.count
+        position = math.log(threshold) / self.log_gamma
+        threshold_key = math.ceil(position)
+        above = sum(count for key, count in self.bins.items() if key > threshold_key)
+        # Part of the bucket holding the threshold, assuming values spread log-uniformly in it
+        above += self.bins.get(threshold_key, 0) * (threshold_key - position)
+        return above / self.count
+
+
+def sketch(values, relative_accuracy=0.01, max_bins=2048):
+    """Builds a DDSketch of an array of values"""
+    result = DDSketch(relative_accuracy, max_bins)
+    result.add(values)
+    return result
+
+
+def rolling_quantiles(times, values, window=60.0, step=1.0, qs=TAIL_QUANTILES, relative_accuracy=0.01):
+    """Quantiles over the last `window` seconds, evaluated every `step` seconds
+
+    Values are sketched per step and the window sketch is maintained by merging the
+    newest step and subtracting the expired one, so memory is bounded by window / step
+    sketches. These are never collapsed, so subtracting stays exact; each holds at most
+    one bucket per relative_accuracy step of the value range. Returns (step end times,
+    array of shape (steps, len(qs))).
+    """
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if not len(times):
+        return np.empty(0), np.empty((0, len(qs)))
+    steps = np.floor((times - times[0]) / step).astype(np.int64)
+    boundaries = np.flatnonzero(np.diff(steps)) + 1
+    window_sketch = DDSketch(relative_accuracy, max_bins=None)
+    window_steps = deque()
+    end_times, results = [], []
+    for chunk_steps, chunk_values in zip(np.split(steps, boundaries), np.split(values, boundaries)):
+        step_sketch = sketch(chunk_values, relative_accuracy, max_bins=None)
+        window_sketch.merge(step_sketch)
+        window_steps.append((chunk_steps[0], step_sketch))
+        while (chunk_steps[0] - window_steps[0][0] + 1) * step > window:
+            window_sketch.subtract(window_steps.popleft()[1])
+        end_times.append(times[0] + (chunk_steps[0] + 1) * step)
+        results.append(window_sketch.quantiles(qs))
+    return np.array(end_times), np.array(results)
+
+
+def tail_latency_report(name, values, limit=None, qs=TAIL_QUANTILES):
+    """Prints the whole-run tail quantiles of a latency series and how often it exceeds limit"""
+    values_sketch = values if isinstance(values, DDSketch) else sketch(values)
+    quantile_text = ", ".join(f"p{q * 100:g}={value:.4f} s" for q, value in zip(qs, values_sketch.quantiles(qs)))
+    text = f"{name}: {quantile_text} (n={values_sketch.count})"
+    if limit is not None:
+        text += f", {values_sketch.fraction_above(limit):.2%} above {limit} s"
+    print(text)
+    return values_sketch
+
+
+def bag_sketches(bag_file, topics=("/solver_time", "/av_rtt")):
+    """Sketches the latency topics of one bag; the results of several bags merge into whole-campaign sketches"""
+    data_storage = load_schema_topics(bag_file, list(topics))
+    return {topic: sketch(data["data"]) for topic, data in data_storage.items()}
+
+
+if __name__ == "__main__":
+    # Usage: python quantiles.py <bag_file> [<bag_file> ...]
+    merged = {}
+    for bag_result in map_bags(bag_sketches, sys.argv[1:]):
+        for topic, topic_sketch in bag_result.items():
+            merged[topic] = merged[topic].merge(topic_sketch) if topic in merged else topic_sketch
+    for topic, topic_sketch in merged.items():
+        tail_latency_report(topic, topic_sketch)
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+MODES = ("linear", "zoh", "asof")
+
+
+def common_time_base(*time_bases):
+    """Evenly spaced time base over the overlap of several time bases, as long as the shortest one"""
+    start = float(max(times[0] for times in time_bases))
+    end = float(min(times[-1] for times in time_bases))
+    return np.linspace(start, end, min(len(times) for times in time_bases))
+
+
+class Resampler:
+    """Aligns any number of signals onto one target time base
+
+    The searchsorted indices and weights are computed once per source time base and
+    reused for every signal sampled on it, so each further signal only costs a gather.
+    Modes:
+      linear  linear interpolation, extrapolated past both ends like
+              interp1d(kind="linear", fill_value="extrapolate")
+      zoh     zero-order hold of the last sample at or before each target time (the
+              first sample before the source starts)
+      asof    pandas merge_asof join for irregular topics: the sample found in
+              `direction`, or NaN when none is within `tolerance` seconds
+    """
+
+    def __init__(self, target, mode="linear", direction="backward", tolerance=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown resampling mode {mode}, expected one of {MODES}")
+        self.target = np.asarray(target, dtype=float)
+        self.mode = mode
+        self.direction = direction
+        self.tolerance = tolerance
+        self.cache = {}
+
+    def weights(self, times):
+        """(order, lower index, upper index, fraction or missing mask) of a source time base"""
+        # Keyed by object identity; the cached entry keeps the time base alive so the id stays valid
+        cached = self.cache.get(id(times))
+        if cached is not None and cached[0] is times:
+            return cached[1]
+
+        source = np.asarray(times, dtype=float)
+        order = None
+        if np.any(source[1:] < source[:-1]):
+            order = np.argsort(source, kind="stable")
+            source = source[order]
+
+        if self.mode == "linear":
+            if len(source) == 1:
+                lower = upper = np.zeros(len(self.target), dtype=np.intp)
+                fraction = np.zeros(len(self.target))
+            else:
+                upper = np.clip(np.searchsorted(source, self.target), 1, len(source) - 1)
+                lower = upper - 1
+                fraction = (self.target - source[lower]) / (source[upper] - source[lower])
+            result = (order, lower, upper, fraction)
+        elif self.mode == "zoh":
+            index = np.clip(np.searchsorted(source, self.target, side="right") - 1, 0, len(source) - 1)
+            result = (order, index, None, None)
+        else:
+            matched = pd.merge_asof(
+                pd.DataFrame({"time": self.target}),
+                pd.DataFrame({"time": source, "index": np.arange(len(source))}),
+                on="time",
+                direction=self.direction,
+                tolerance=self.tolerance,
+            )["index"]
+            missing = matched.isna().to_numpy()
+            result = (order, matched.fillna(0).to_numpy(dtype=np.intp), None, missing)
+
+        self.cache[id(times)] = (times, result)
+        return result
+
+    def __call__(self, times, values):
+        """One signal sampled at times, on the target time base"""
+        order, lower, upper, extra = self.weights(times)
+        values = np.asarray(values, dtype=float)
+        if order is not None:
+            values = values[order]
+        if self.mode == "linear":
+            return values[lower] + extra * (values[upper] - values[lower])
+        result = values[lower]
+        if self.mode == "asof":
+            result[extra] = np.nan
+        return result
+
+    def resample(self, *signals):
+        """Aligns (times, values) pairs in one pass, returning the resampled values in order"""
+        return [self(times, values) for times, values in signals]
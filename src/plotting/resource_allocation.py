@@ -0,0 +1,82 @@
+from collections import namedtuple
+import numpy as np
+
+# How the allocated resources are rebuilt from the /time_resources demand:
+#   warmup       samples received before this many seconds count as zero demand
+#   thresholds   demand below the first threshold gets levels[0], up to the second
+#                (inclusive) levels[1], above it levels[2]
+#   first_hold   the first first_hold + 1 samples at levels[1] stay at levels[0]; later
+#                ones take the demand at the sample where that hold ended
+#   second_hold  samples at levels[2] after the last levels[1] one take that same demand
+#                until first_hold + second_hold samples in total were switched
+#   end_time     time of the last sample, which closes the step function
+ResourceSchedule = namedtuple(
+    "ResourceSchedule",
+    ["warmup", "thresholds", "levels", "first_hold", "second_hold", "end_time"],
+    defaults=[4.95, (3000, 5000), (1500, 3500, 6000), 500, 1000, 240],
+)
+
+
+def reconstruct_resources(time_r, time_resources, schedule=ResourceSchedule()):
+    """Rebuilds the allocated resources step function from the /time_resources demand
+
+    Vectorized equivalent of the counter loops the plotting scripts used; every pass is
+    one NumPy operation and the holds are found with flatnonzero instead of Python
+    loops with break counters. Returns new (time_r, time_resources, resources) arrays;
+    like the loops, the warmup zeroes time_resources and the last sample is moved to
+    end_time.
+    """
+    time_r = np.array(time_r, dtype=float)
+    demand = np.array(time_resources, dtype=float)
+    n = len(demand)
+    resources = np.zeros(n)
+    if n == 0:
+        return time_r, demand, resources
+    last = n - 1  # The last sample is only set at the end
+    low, mid, high = schedule.levels
+
+    # Zero demand during the warmup, then classify every sample by the thresholds
+    warmup = np.flatnonzero(time_r[:last] < schedule.warmup)
+    demand[warmup] = 0
+    body = demand[:last]
+    resources[:last] = np.where(
+        body < schedule.thresholds[0],
+        low,
+        np.where((body >= schedule.thresholds[0]) & (body <= schedule.thresholds[1]), mid, high),
+    )
+
+    # Hold the first first_hold + 1 mid samples at the low level
+    mids = np.flatnonzero(resources[:last] == mid)
+    if len(mids) > schedule.first_hold:
+        held = mids[: schedule.first_hold + 1]
+        switch = held[-1] + 1
+    else:
+        held = mids
+        switch = last
+    resources[held] = low
+    switched = len(held)
+
+    # Later mid samples take the demand at the switch
+    remaining_mids = switch + np.flatnonzero(resources[switch:last] == mid)
+    resources[remaining_mids] = demand[switch] if len(remaining_mids) else 0
+    after_mid = remaining_mids[-1] + 1 if len(remaining_mids) else 0
+
+    # High samples after them take the same demand until second_hold samples were switched
+    hold_end = 0
+    if after_mid < last:
+        highs = after_mid + np.flatnonzero(resources[after_mid:last] == high)
+        if switched > schedule.second_hold:
+            # Already over the limit: only the first sample is looked at
+            highs = highs[:1] if len(highs) and highs[0] == after_mid else highs[:0]
+            hold_end = after_mid + 1
+        else:
+            highs = highs[: schedule.second_hold - switched + 1]
+            reached = len(highs) == schedule.second_hold - switched + 1
+            hold_end = highs[-1] + 1 if reached else last
+        resources[highs] = demand[switch]
+
+    # Everything after holds the demand at the end of the second hold
+    resources[hold_end:last] = demand[hold_end]
+    time_r[last] = schedule.end_time
+    resources[last] = demand[hold_end]
+    return time_r, demand, resources
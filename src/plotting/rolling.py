@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+# Rolling statistics in O(n): pandas keeps running sums for mean/std and a monotonic
+# deque for min/max, so the cost does not grow with the window length. Medians use a
+# skiplist, O(log w) per sample.
+
+
+def rolling(values, window=1000, times=None, min_periods=1, center=False):
+    """pandas Rolling over values; window counts samples, or seconds when times are given
+
+    With the default min_periods=1 the first window-1 outputs average over the samples
+    seen so far, so the result has the same length as the input. Time-based windows
+    need non-decreasing times. With center the window is centred on each sample
+    instead of ending at it.
+    """
+    series = pd.Series(np.asarray(values, dtype=float))
+    if times is None:
+        return series.rolling(window, min_periods=min_periods, center=center)
+    series.index = pd.to_timedelta(np.asarray(times, dtype=float), unit="s")
+    return series.rolling(pd.Timedelta(seconds=window), min_periods=min_periods, center=center)
+
+
+def rolling_mean(values, window=1000, times=None, min_periods=1):
+    """Moving average over the last `window` samples (or seconds)"""
+    return rolling(values, window, times, min_periods).mean().to_numpy()
+
+
+def rolling_min(values, window=1000, times=None, min_periods=1):
+    """Moving minimum over the last `window` samples (or seconds)"""
+    return rolling(values, window, times, min_periods).min().to_numpy()
+
+
+def rolling_max(values, window=1000, times=None, min_periods=1):
+    """Moving maximum over the last `window` samples (or seconds)"""
+    return rolling(values, window, times, min_periods).max().to_numpy()
+
+
+def rolling_std(values, window=1000, times=None, min_periods=1, ddof=0):
+    """Moving standard deviation over the last `window` samples (or seconds), population std by default"""
+    return rolling(values, window, times, min_periods).std(ddof=ddof).to_numpy()
+
+
+def rolling_median(values, window=1000, times=None, min_periods=1, center=False):
+    """Moving median over the last (or, with center, the surrounding) `window` samples or seconds"""
+    return rolling(values, window, times, min_periods, center).median().to_numpy()
+
+
+# Scales a median absolute deviation to the standard deviation of normally distributed data
+MAD_TO_STD = 1.4826
+
+
+def hampel(values, window=101, n_sigmas=3.0, times=None, center=True, min_mad=0.0):
+    """Hampel filter: replaces samples more than n_sigmas robust stds from the rolling median by that median
+
+    The MAD is floored at min_mad and nothing is flagged where it is 0. Returns (filtered values, outlier mask).
+    """
+    values = np.asarray(values, dtype=float)
+    median = rolling_median(values, window, times, center=center)
+    deviation = np.abs(values - median)
+    mad = np.maximum(rolling_median(deviation, window, times, center=center), min_mad)
+    outliers = (mad > 0) & (deviation > n_sigmas * MAD_TO_STD * mad)
+    return np.where(outliers, median, values), outliers
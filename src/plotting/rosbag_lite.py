@@ -0,0 +1,536 @@
+import bz2
+import heapq
+import mmap
+import os
+import re
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+# Self-contained reader for rosbag v2.0 files, see http://wiki.ros.org/Bags/Format/2.0.
+# Messages are decoded from the definitions stored in the bag itself, so no ROS install
+# (rosbag, genpy or the message packages) is needed.
+
+BAG_MAGIC = b"#ROSBAG V2.0\n"
+
+OP_MSG_DATA = 0x02
+OP_BAG_HEADER = 0x03
+OP_INDEX_DATA = 0x04
+OP_CHUNK = 0x05
+OP_CHUNK_INFO = 0x06
+OP_CONNECTION = 0x07
+
+PRIMITIVES = {
+    "bool": "?",
+    "int8": "b",
+    "uint8": "B",
+    "byte": "b",
+    "char": "B",
+    "int16": "h",
+    "uint16": "H",
+    "int32": "i",
+    "uint32": "I",
+    "int64": "q",
+    "uint64": "Q",
+    "float32": "f",
+    "float64": "d",
+}
+
+UINT32 = struct.Struct("<I")
+TIME = struct.Struct("<II")
+INDEX_ENTRY = np.dtype([("secs", "<u4"), ("nsecs", "<u4"), ("offset", "<u4")])
+
+
+def parse_header(buffer):
+    """Parses a record or connection header into {name: raw bytes}"""
+    fields = {}
+    offset = 0
+    while offset < len(buffer):
+        (length,) = UINT32.unpack_from(buffer, offset)
+        offset += 4
+        field = bytes(buffer[offset : offset + length])
+        offset += length
+        name, _, value = field.partition(b"=")
+        fields[name.decode()] = value
+    return fields
+
+
+def iter_records(buffer, offset=0, end=None):
+    """Yields (header, data) memoryviews of the records in buffer[offset:end]"""
+    view = memoryview(buffer)
+    end = len(buffer) if end is None else end
+    while offset < end:
+        (header_length,) = UINT32.unpack_from(view, offset)
+        offset += 4
+        header = parse_header(view[offset : offset + header_length])
+        offset += header_length
+        (data_length,) = UINT32.unpack_from(view, offset)
+        offset += 4
+        yield header, view[offset : offset + data_length]
+        offset += data_length
+
+
+def scan_index(data):
+    """Builds {conn_id: INDEX_ENTRY array} of the message records of a decompressed chunk
+
+    Used for chunks written without index data records.
+    """
+    view = memoryview(data)
+    entries = {}
+    offset = 0
+    while offset < len(view):
+        record_offset = offset
+        (header_length,) = UINT32.unpack_from(view, offset)
+        header = parse_header(view[offset + 4 : offset + 4 + header_length])
+        offset += 4 + header_length
+        (data_length,) = UINT32.unpack_from(view, offset)
+        offset += 4 + data_length
+        if header["op"][0] == OP_MSG_DATA:
+            (conn_id,) = UINT32.unpack(header["conn"])
+            entries.setdefault(conn_id, []).append(TIME.unpack(header["time"]) + (record_offset,))
+    return {conn_id: np.array(conn_entries, dtype=INDEX_ENTRY) for conn_id, conn_entries in entries.items()}
+
+
+def unpack_time(value):
+    secs, nsecs = TIME.unpack(value)
+    return secs + nsecs * 1e-9
+
+
+def decompress(compression, data):
+    if compression == "none":
+        return data
+    if compression == "bz2":
+        return bz2.decompress(data)
+    if compression == "lz4":
+        if lz4_frame is None:
+            raise ImportError("The lz4 package is required to read lz4-compressed bags")
+        return lz4_frame.decompress(data)
+    raise ValueError(f"Unsupported chunk compression {compression!r}")
+
+
+def decompress_workers(workers=None):
+    """Number of decompression threads: the argument, $CNMPC_BAG_DECOMPRESS_WORKERS, or one per core"""
+    if workers:
+        return workers
+    return int(os.environ.get("CNMPC_BAG_DECOMPRESS_WORKERS", 0)) or os.cpu_count() or 1
+
+
+def parse_definitions(type_name, definition):
+    """Splits a full message definition into {type: [(field_type, field_name)]}"""
+    definitions = {}
+    current = type_name
+    for index, section in enumerate(re.split(r"^={10,}\s*$", definition, flags=re.M)):
+        lines = section.strip().splitlines()
+        if index > 0:
+            current = lines[0].split(":", 1)[1].strip()
+            lines = lines[1:]
+        fields = []
+        for line in lines:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            field_type, field_name = line.split(None, 1)
+            if "=" in field_name:
+                continue  # Constant
+            fields.append((field_type, field_name.strip()))
+        definitions[current] = fields
+    return definitions
+
+
+def resolve_type(field_type, parent_type):
+    if field_type in PRIMITIVES or field_type in ("string", "time", "duration"):
+        return field_type
+    if field_type == "Header":
+        return "std_msgs/Header"
+    if "/" not in field_type:
+        return f"{parent_type.split('/')[0]}/{field_type}"
+    return field_type
+
+
+def fixed_size(base, definitions):
+    """Serialized size of a non-array type, or None when it contains strings or variable arrays"""
+    if base in PRIMITIVES:
+        return struct.calcsize("<" + PRIMITIVES[base])
+    if base in ("time", "duration"):
+        return 8
+    if base == "string":
+        return None
+    total = 0
+    for field_type, _ in definitions[base]:
+        field_base, is_array, length = split_type(field_type, base)
+        size = fixed_size(field_base, definitions)
+        if size is None or (is_array and length is None):
+            return None
+        total += size * (length if is_array else 1)
+    return total
+
+
+def split_type(field_type, parent_type):
+    """Splits "float64[3]" into (resolved base type, is_array, fixed length or None)"""
+    match = re.match(r"^([^\[]+)(\[(\d*)\])?$", field_type)
+    length = int(match.group(3)) if match.group(3) else None
+    return resolve_type(match.group(1), parent_type), match.group(2) is not None, length
+
+
+def flatten_columns(type_name, definitions, prefix=""):
+    """Lists the bagpy-style column names a message type is decoded into (see compile_decoder)"""
+    columns = []
+    for field_type, field_name in definitions[type_name]:
+        name = prefix + field_name
+        base, is_array, _ = split_type(field_type, type_name)
+        if base in ("time", "duration") and not is_array:
+            columns += [name + ".secs", name + ".nsecs"]
+        elif is_array or base in PRIMITIVES or base == "string":
+            columns.append(name)
+        else:
+            columns += flatten_columns(base, definitions, name + ".")
+    return columns
+
+
+def compile_decoder(type_name, definitions, prefix="", fields=None):
+    """Builds decode(buffer, offset, out) -> offset for a message type
+
+    Fields are written to `out` flattened with bagpy-style names ("stamp.secs",
+    "header.stamp.nsecs", "data"). Primitive arrays become numpy arrays, uint8/char
+    arrays bytes, and arrays of messages lists of flattened dicts. When `fields` is
+    given, only those columns are decoded and every other field is skipped over.
+    """
+    steps = []
+    for field_type, field_name in definitions[type_name]:
+        name = prefix + field_name
+        base, is_array, length = split_type(field_type, type_name)
+        if fields is None or name in fields:
+            steps.append(compile_field(name, base, is_array, length, definitions))
+        elif any(field.startswith(name + ".") for field in fields) and not is_array:
+            if base in ("time", "duration"):
+                steps.append(compile_time(name, base, fields))
+            else:
+                steps.append(compile_decoder(base, definitions, prefix=name + ".", fields=fields))
+        else:
+            steps.append(compile_skip(base, is_array, length, definitions))
+
+    def decode(buffer, offset, out):
+        for step in steps:
+            offset = step(buffer, offset, out)
+        return offset
+
+    return decode
+
+
+def compile_time(name, base, fields=None):
+    """Builds a step decoding a time or duration into its .secs and .nsecs columns"""
+    packer = struct.Struct("<Ii" if base == "duration" else "<II")
+    columns = [
+        column for column in (name + ".secs", name + ".nsecs") if fields is None or column in fields
+    ]
+
+    def decode_time(buffer, offset, out):
+        for column, value in zip((name + ".secs", name + ".nsecs"), packer.unpack_from(buffer, offset)):
+            if column in columns:
+                out[column] = value
+        return offset + 8
+
+    return decode_time
+
+
+def compile_skip(base, is_array, length, definitions):
+    """Builds a step that moves past a field without decoding it"""
+    size = fixed_size(base, definitions)
+    if not is_array:
+        if size is not None:
+            return lambda buffer, offset, out: offset + size
+        if base == "string":
+            return lambda buffer, offset, out: offset + 4 + UINT32.unpack_from(buffer, offset)[0]
+        return compile_decoder(base, definitions, fields=set())
+
+    if size is not None and length is not None:
+        return lambda buffer, offset, out: offset + size * length
+    if size is not None:
+        return lambda buffer, offset, out: offset + 4 + size * UINT32.unpack_from(buffer, offset)[0]
+
+    element = compile_skip(base, False, None, definitions)
+
+    def skip_array(buffer, offset, out):
+        count = length
+        if count is None:
+            (count,) = UINT32.unpack_from(buffer, offset)
+            offset += 4
+        for _ in range(count):
+            offset = element(buffer, offset, out)
+        return offset
+
+    return skip_array
+
+
+def compile_field(name, base, is_array, length, definitions):
+    if not is_array:
+        if base in PRIMITIVES:
+            packer = struct.Struct("<" + PRIMITIVES[base])
+
+            def decode_primitive(buffer, offset, out):
+                (out[name],) = packer.unpack_from(buffer, offset)
+                return offset + packer.size
+
+            return decode_primitive
+        if base == "string":
+
+            def decode_string(buffer, offset, out):
+                (size,) = UINT32.unpack_from(buffer, offset)
+                out[name] = bytes(buffer[offset + 4 : offset + 4 + size]).decode("utf-8", "replace")
+                return offset + 4 + size
+
+            return decode_string
+        if base in ("time", "duration"):
+            return compile_time(name, base)
+        return compile_decoder(base, definitions, prefix=f"{name}." if name else "")
+
+    if base in PRIMITIVES:
+        dtype = np.dtype("<" + PRIMITIVES[base])
+
+        def decode_primitive_array(buffer, offset, out):
+            count = length
+            if count is None:
+                (count,) = UINT32.unpack_from(buffer, offset)
+                offset += 4
+            if base in ("uint8", "char"):
+                out[name] = bytes(buffer[offset : offset + count])
+            else:
+                out[name] = np.frombuffer(buffer, dtype, count, offset).copy()
+            return offset + count * dtype.itemsize
+
+        return decode_primitive_array
+
+    element = compile_field("", base, False, None, definitions)
+
+    def decode_array(buffer, offset, out):
+        count = length
+        if count is None:
+            (count,) = UINT32.unpack_from(buffer, offset)
+            offset += 4
+        values = []
+        for _ in range(count):
+            value = {}
+            offset = element(buffer, offset, value)
+            values.append(value[""] if "" in value else value)
+        out[name] = values
+        return offset
+
+    return decode_array
+
+
+class Connection:
+    def __init__(self, conn_id, topic, fields):
+        self.id = conn_id
+        self.topic = topic
+        self.type = fields["type"].decode()
+        self.md5sum = fields["md5sum"].decode()
+        self.definition = fields["message_definition"].decode()
+        self.decoders = {}
+
+    def columns(self):
+        """Column names of the decoded messages"""
+        return flatten_columns(self.type, parse_definitions(self.type, self.definition))
+
+    def decode(self, data, fields=None):
+        """Decodes a serialized message into a flat {column: value} dict, optionally only the given columns"""
+        key = None if fields is None else frozenset(fields)
+        decoder = self.decoders.get(key)
+        if decoder is None:
+            decoder = compile_decoder(self.type, parse_definitions(self.type, self.definition), fields=key)
+            self.decoders[key] = decoder
+        columns = {}
+        decoder(data, 0, columns)
+        return columns
+
+
+class ChunkInfo:
+    def __init__(self, header, data):
+        (self.position,) = struct.unpack("<Q", header["chunk_pos"])
+        self.start_time = unpack_time(header["start_time"])
+        self.end_time = unpack_time(header["end_time"])
+        self.message_counts = {}
+        for offset in range(0, len(data), 8):
+            conn_id, count = struct.unpack_from("<II", data, offset)
+            self.message_counts[conn_id] = count
+
+
+class Bag:
+    """Read-only rosbag v2.0 file, indexed through its connection and chunk info records
+
+    Compressed chunks are decompressed by `workers` threads up to `prefetch` chunks ahead
+    of the message decoding (see iter_chunk_data).
+    """
+
+    def __init__(self, path, workers=None, prefetch=None):
+        self.path = path
+        self.workers = decompress_workers(workers)
+        self.prefetch = prefetch or 2 * self.workers
+        self.file = open(path, "rb")
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buffer[: len(BAG_MAGIC)] != BAG_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a rosbag v2.0 file")
+
+        bag_header, _ = next(iter_records(self.buffer, len(BAG_MAGIC)))
+        (index_position,) = struct.unpack("<Q", bag_header["index_pos"])
+        if index_position == 0:
+            self.close()
+            raise ValueError(f"{path} is not indexed, run `rosbag reindex` on it first")
+
+        self.connections = {}
+        self.chunks = []
+        for header, data in iter_records(self.buffer, index_position):
+            op = header["op"][0]
+            if op == OP_CONNECTION:
+                (conn_id,) = UINT32.unpack(header["conn"])
+                self.connections[conn_id] = Connection(conn_id, header["topic"].decode(), parse_header(data))
+            elif op == OP_CHUNK_INFO:
+                self.chunks.append(ChunkInfo(header, data))
+        self.chunks.sort(key=lambda chunk: chunk.start_time)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        try:
+            self.buffer.close()
+        except BufferError:
+            pass  # A message view is still alive; the map is released with it
+        self.file.close()
+
+    def get_start_time(self):
+        return min(chunk.start_time for chunk in self.chunks)
+
+    def get_end_time(self):
+        return max(chunk.end_time for chunk in self.chunks)
+
+    def chunk_data(self, chunk):
+        """Returns the decompressed records of one chunk"""
+        header, data = next(iter_records(self.buffer, chunk.position))
+        return decompress(header["compression"].decode(), data)
+
+    def chunk_entries(self, chunk):
+        """Returns the compression of a chunk and {conn_id: INDEX_ENTRY array} of its messages
+
+        Both come from the chunk header and the index data records written after the
+        chunk, so nothing is decompressed.
+        """
+        records = iter_records(self.buffer, chunk.position)
+        header, _ = next(records)
+        compression = header["compression"].decode()
+        entries = {}
+        for header, data in records:
+            if header["op"][0] != OP_INDEX_DATA:
+                break
+            (conn_id,) = UINT32.unpack(header["conn"])
+            entries[conn_id] = np.frombuffer(data, INDEX_ENTRY)
+        return compression, entries
+
+    def chunk_index(self, chunk):
+        """Returns the compression of a chunk and {conn_id: receive times} of its messages (see chunk_entries)"""
+        compression, entries = self.chunk_entries(chunk)
+        return compression, {
+            conn_id: conn_entries["secs"] + conn_entries["nsecs"] * 1e-9 for conn_id, conn_entries in entries.items()
+        }
+
+    def iter_chunk_data(self, chunks):
+        """Yields the decompressed records of the chunks in order
+
+        bz2 and lz4 release the GIL while decompressing, so the next chunks are decompressed
+        on other cores while the current one is decoded. At most `prefetch` decompressed
+        chunks are held in memory.
+        """
+        if self.workers <= 1:
+            for chunk in chunks:
+                yield self.chunk_data(chunk)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(self.chunk_data, chunk))
+                if len(pending) >= self.prefetch:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def read_messages(self, topics=None, start_time=None, end_time=None, fields=None):
+        """Yields (topic, columns, time) of the requested topics between start_time and end_time (seconds)
+
+        fields optionally maps topics to the only columns to decode for them (see read_raw).
+        """
+        fields = fields or {}
+        for connection, message, t in self.read_raw(topics, start_time, end_time):
+            yield connection.topic, connection.decode(message, fields.get(connection.topic)), t
+
+    def read_raw(self, topics=None, start_time=None, end_time=None):
+        """Yields (connection, serialized message, time) of the requested topics between start_time and end_time
+
+        Messages come in receive time order across topics and chunks, like
+        rosbag.Bag.read_messages. Chunks outside the window or without any requested
+        connection are skipped using the chunk infos, without being read or decompressed.
+        Chunks whose time ranges overlap are decompressed together and their index
+        entries merged by time, so only those groups are held in memory at once.
+        """
+        connections = {
+            conn_id: connection
+            for conn_id, connection in self.connections.items()
+            if topics is None or connection.topic in topics
+        }
+        chunks = [
+            chunk
+            for chunk in self.chunks
+            if (start_time is None or chunk.end_time >= start_time)
+            and (end_time is None or chunk.start_time <= end_time)
+            and any(conn_id in connections for conn_id in chunk.message_counts)
+        ]
+
+        # Group the chunks (sorted by start time) whose time ranges overlap
+        groups = []
+        group_end = None
+        for chunk in chunks:
+            if groups and chunk.start_time <= group_end:
+                groups[-1].append(chunk)
+                group_end = max(group_end, chunk.end_time)
+            else:
+                groups.append([chunk])
+                group_end = chunk.end_time
+
+        chunk_data = self.iter_chunk_data(chunks)
+        for group in groups:
+            group_data = [next(chunk_data) for _ in group]
+            streams = []
+            for chunk, data in zip(group, group_data):
+                _, entries = self.chunk_entries(chunk)
+                if any(conn_id in connections and conn_id not in entries for conn_id in chunk.message_counts):
+                    entries = scan_index(data)
+                for conn_id, conn_entries in entries.items():
+                    if conn_id in connections:
+                        streams.append(self.index_stream(conn_entries, data, connections[conn_id], start_time, end_time))
+            for _, connection, data, offset in heapq.merge(*streams, key=lambda entry: entry[0]):
+                header, message = next(iter_records(data, offset))
+                yield connection, message, unpack_time(header["time"])
+
+    @staticmethod
+    def index_stream(entries, data, connection, start_time=None, end_time=None):
+        """Yields (time in ns, connection, chunk data, offset) of the index entries within the window, sorted by time"""
+        times = entries["secs"] + entries["nsecs"] * 1e-9
+        keep = np.ones(len(entries), dtype=bool)
+        if start_time is not None:
+            keep &= times >= start_time
+        if end_time is not None:
+            keep &= times <= end_time
+        entries = entries[keep]
+        stamps = entries["secs"].astype(np.int64) * 1_000_000_000 + entries["nsecs"]
+        order = np.argsort(stamps, kind="stable")
+        for stamp, offset in zip(stamps[order].tolist(), entries["offset"][order].tolist()):
+            yield stamp, connection, data, offset
@@ -0,0 +1,251 @@
+import math
+import random
+import sys
+from collections import deque
+import numpy as np
+from bag_loader import bag_start_time, iter_bag
+from rolling import MAD_TO_STD
+
+
+# Each stage consumes and yields (topic, time, value) tuples one message at a time, so a
+# pipeline only ever holds its stage buffers (at most one smoothing window) in memory.
+
+
+def decode(bag_file, topics, field="data", start=None, end=None):
+    """Streams (topic, receive time, field value) from the bag, optionally within [start, end] seconds of its start"""
+    offset = bag_start_time(bag_file)
+    for topic, t, columns in iter_bag(bag_file, topics, start, end):
+        value = columns.get(field)
+        if value is not None:
+            yield topic, t - offset, value
+
+
+def scale(stream, factor=1.0, offset=0.0):
+    """Applies the unit scaling of a topic, e.g. factor=1e-3 for /solver_time"""
+    for topic, t, value in stream:
+        yield topic, t, value * factor + offset
+
+
+def finite(stream):
+    """Drops NaN and infinite values"""
+    for topic, t, value in stream:
+        if math.isfinite(value):
+            yield topic, t, value
+
+
+def smooth(stream, window=1000):
+    """Moving average over the last `window` samples of each topic, averaging fewer at the start"""
+    windows = {}
+    for topic, t, value in stream:
+        buffer, total = windows.get(topic, (deque(), 0.0))
+        buffer.append(value)
+        total += value
+        if len(buffer) > window:
+            total -= buffer.popleft()
+        windows[topic] = (buffer, total)
+        yield topic, t, total / len(buffer)
+
+
+class SkiplistNode:
+    __slots__ = ("value", "next", "width")
+
+    def __init__(self, value, levels):
+        self.value = value
+        self.next = [None] * levels
+        self.width = [1] * levels
+
+
+class IndexableSkiplist:
+    """Sorted multiset with O(log n) insert, remove and access by rank (expected)
+
+    Each link stores how many values it skips, as in the skiplist pandas uses for its
+    rolling medians.
+    """
+
+    def __init__(self, expected_size):
+        self.size = 0
+        self.levels = max(1, int(math.log2(max(expected_size, 1))) + 1)
+        self.head = SkiplistNode(None, self.levels)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, rank):
+        node = self.head
+        rank += 1
+        for level in reversed(range(self.levels)):
+            while node.next[level] is not None and node.width[level] <= rank:
+                rank -= node.width[level]
+                node = node.next[level]
+        return node.value
+
+    def insert(self, value):
+        # Last node before the insert position on every level, and its rank
+        chain = [None] * self.levels
+        ranks = [0] * self.levels
+        node, rank = self.head, 0
+        for level in reversed(range(self.levels)):
+            while node.next[level] is not None and node.next[level].value <= value:
+                rank += node.width[level]
+                node = node.next[level]
+            chain[level], ranks[level] = node, rank
+
+        levels = min(self.levels, 1 - int(math.log2(1.0 - random.random())))
+        new = SkiplistNode(value, levels)
+        for level in range(levels):
+            previous = chain[level]
+            skipped = rank - ranks[level]
+            new.next[level] = previous.next[level]
+            new.width[level] = previous.width[level] - skipped
+            previous.next[level] = new
+            previous.width[level] = skipped + 1
+        for level in range(levels, self.levels):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, value):
+        # Last node before the first occurrence of value on every level
+        chain = [None] * self.levels
+        node = self.head
+        for level in reversed(range(self.levels)):
+            while node.next[level] is not None and node.next[level].value < value:
+                node = node.next[level]
+            chain[level] = node
+        target = chain[0].next[0]
+        if target is None or target.value != value:
+            raise KeyError(value)
+
+        for level in range(len(target.next)):
+            previous = chain[level]
+            previous.width[level] += target.width[level] - 1
+            previous.next[level] = target.next[level]
+        for level in range(len(target.next), self.levels):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+
+class SortedWindow:
+    """The last `window` values in arrival order, also kept in an IndexableSkiplist for O(log w) medians"""
+
+    def __init__(self, window):
+        self.window = window
+        self.buffer = deque()
+        self.ordered = IndexableSkiplist(window)
+
+    def add(self, value):
+        self.buffer.append(value)
+        self.ordered.insert(value)
+        if len(self.buffer) > self.window:
+            self.ordered.remove(self.buffer.popleft())
+
+    def median(self):
+        middle = len(self.ordered) // 2
+        if len(self.ordered) % 2:
+            return self.ordered[middle]
+        return (self.ordered[middle - 1] + self.ordered[middle]) / 2
+
+
+def hampel(stream, window=101, n_sigmas=3.0, min_mad=0.0):
+    """Replaces each value far from the median of the last `window` samples of its topic by that median
+
+    Streaming counterpart of rolling.hampel(center=False), with identical results.
+    """
+    windows = {}
+    for topic, t, value in stream:
+        if topic not in windows:
+            windows[topic] = (SortedWindow(window), SortedWindow(window))
+        values, deviations = windows[topic]
+        values.add(value)
+        median = values.median()
+        deviation = abs(value - median)
+        deviations.add(deviation)
+        mad = max(deviations.median(), min_mad)
+        if mad > 0 and deviation > n_sigmas * MAD_TO_STD * mad:
+            value = median
+        yield topic, t, value
+
+
+class RunningStats:
+    """Count, mean, std, min and max of a stream, updated one value at a time (Welford)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / self.count) if self.count else math.nan
+
+
+class Downsampler:
+    """Averages a stream into fixed time buckets, keeping one point per bucket for plotting"""
+
+    def __init__(self, bucket_seconds=1.0):
+        self.bucket_seconds = bucket_seconds
+        self.bucket = None
+        self.total = 0.0
+        self.count = 0
+        self.times = []
+        self.values = []
+
+    def add(self, t, value):
+        bucket = int(t // self.bucket_seconds)
+        if bucket != self.bucket:
+            self.flush()
+            self.bucket = bucket
+        self.total += value
+        self.count += 1
+
+    def flush(self):
+        if self.count:
+            self.times.append((self.bucket + 0.5) * self.bucket_seconds)
+            self.values.append(self.total / self.count)
+        self.total = 0.0
+        self.count = 0
+
+    def series(self):
+        self.flush()
+        return np.array(self.times), np.array(self.values)
+
+
+def aggregate(stream, bucket_seconds=1.0):
+    """Consumes a stream into per-topic RunningStats and downsampled (time, value) series"""
+    stats = {}
+    downsamplers = {}
+    for topic, t, value in stream:
+        if topic not in stats:
+            stats[topic] = RunningStats()
+            downsamplers[topic] = Downsampler(bucket_seconds)
+        stats[topic].add(value)
+        downsamplers[topic].add(t, value)
+    return stats, {topic: downsampler.series() for topic, downsampler in downsamplers.items()}
+
+
+def summarize(bag_file, topics, field="data", factor=1.0, window=1000, bucket_seconds=1.0, start=None, end=None):
+    """decode -> scale -> finite -> smooth -> aggregate, with bounded memory"""
+    stream = decode(bag_file, topics, field, start, end)
+    stream = finite(scale(stream, factor))
+    if window:
+        stream = smooth(stream, window)
+    return aggregate(stream, bucket_seconds)
+
+
+if __name__ == "__main__":
+    # Usage: python stream.py <bag_file> <topic> [<topic> ...]
+    stats, _ = summarize(sys.argv[1], sys.argv[2:], window=0)
+    for topic, topic_stats in stats.items():
+        print(
+            f"{topic}: n={topic_stats.count} mean={topic_stats.mean:.6g} std={topic_stats.std:.6g} "
+            f"min={topic_stats.min:.6g} max={topic_stats.max:.6g}"
+        )
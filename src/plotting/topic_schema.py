@@ -0,0 +1,61 @@
+from collections import namedtuple
+from bag_loader import bag_topic_types, load_topics
+from extract_data_to_dict import extract_data_to_dict
+
+TopicSchema = namedtuple("TopicSchema", ["msg_type", "fields", "scale"], defaults=[{}])
+
+# Recorded topics: message type, the columns the analysis scripts need (besides Time),
+# and the factors converting those columns to SI units
+TOPIC_SCHEMAS = {
+    "/av_downlink": TopicSchema("std_msgs/Float64", ["data"]),
+    "/av_uplink": TopicSchema("std_msgs/Float64", ["data"]),
+    "/downlink_delay": TopicSchema("std_msgs/Header", ["stamp.secs", "stamp.nsecs"]),
+    "/uplink_delay": TopicSchema("std_msgs/Header", ["stamp.secs", "stamp.nsecs"]),
+    "/solver_time": TopicSchema("std_msgs/Float64", ["data"], {"data": 1e-3}),  # ms
+    "/av_solver_time": TopicSchema("std_msgs/Float64", ["data"]),
+    "/av_rtt": TopicSchema("std_msgs/Float64", ["data"]),
+    "/equilibrium_resources": TopicSchema("std_msgs/Float64", ["data"]),
+    "/time_resources": TopicSchema("std_msgs/Float64", ["data"]),
+    "/time_error": TopicSchema("std_msgs/Float64", ["data"]),
+    "/av_time_error": TopicSchema("std_msgs/Float64", ["data"]),
+    "/k8s_node_metrics": TopicSchema("std_msgs/String", ["data"]),
+    "/k8s_pod_metrics": TopicSchema("std_msgs/String", ["data"]),
+    "/results": TopicSchema("std_msgs/Float64MultiArray", ["data"]),
+    "/available_resource": TopicSchema("std_msgs/Float64MultiArray", ["data"]),
+    "/number_of_agents": TopicSchema("std_msgs/Float64", ["data"]),
+}
+
+
+def topic_schema(topic):
+    """Returns the registered schema of a topic"""
+    if topic not in TOPIC_SCHEMAS:
+        raise KeyError(f"Topic {topic} is not registered in TOPIC_SCHEMAS")
+    return TOPIC_SCHEMAS[topic]
+
+
+def load_schema_topics(bag_file, topics, start=None, end=None, relative=True, has_time=True):
+    """Loads topics projected to their registered fields and scaled to SI units
+
+    Only the registered columns are decoded from the bag (see load_topics). Returns
+    {topic: {"Time": ..., <field>: ...}} like extract_data_to_dict, with Time rebased
+    to the first sample of each topic unless has_time is False. Topics without any
+    message in the bag are left out; a ValueError is raised when a topic was recorded
+    with another message type than its schema.
+    """
+    schemas = {topic: topic_schema(topic) for topic in topics}
+    topic_types = bag_topic_types(bag_file)
+    for topic, schema in schemas.items():
+        if topic in topic_types and topic_types[topic] != schema.msg_type:
+            raise ValueError(f"{topic} is recorded as {topic_types[topic]} in {bag_file}, expected {schema.msg_type}")
+    fields = {topic: schema.fields for topic, schema in schemas.items()}
+    bag_data = load_topics(bag_file, topics, start, end, relative, fields=fields)
+
+    data_storage = {}
+    for topic, schema in schemas.items():
+        if not len(bag_data[topic]["Time"]):
+            continue
+        data = extract_data_to_dict(bag_data[topic], ["Time"] + schema.fields, has_time)
+        for field, factor in schema.scale.items():
+            data[field] = data[field] * factor
+        data_storage[topic] = data
+    return data_storage
@@ -0,0 +1,56 @@
+import math
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "plotting"))
+
+import k8s_metrics  # noqa: E402
+
+
+class TestParseMetricsStrings(unittest.TestCase):
+    def test_pod_and_node_strings(self):
+        parsed = k8s_metrics.parse_metrics_strings(
+            ["cnmpc-0: CPU=250m, Memory=64Mi", "node-a: CPU=2 cores (50%%), Memory=1Gi bytes (12.5%%)"]
+        )
+        self.assertEqual(parsed["name"].tolist(), ["cnmpc-0", "node-a"])
+        self.assertEqual(parsed["cpu"].tolist(), [250.0, 2000.0])
+        self.assertEqual(parsed["memory"].tolist(), [64 * 2**20, 2**30])
+        self.assertTrue(math.isnan(parsed["cpu_percent"][0]))
+        self.assertEqual(parsed["memory_percent"][1], 12.5)
+
+    def test_memory_units(self):
+        parsed = k8s_metrics.parse_metrics_strings(
+            ["a: CPU=1m, Memory=100k", "a: CPU=1m, Memory=2M", "a: CPU=1m, Memory=3Ki", "a: CPU=1m, Memory=42"]
+        )
+        self.assertEqual(parsed["memory"].tolist(), [100e3, 2e6, 3 * 2**10, 42])
+
+    def test_unknown_unit_is_nan(self):
+        parsed = k8s_metrics.parse_metrics_strings(["a: CPU=1m, Memory=100x", "garbage"])
+        self.assertEqual(parsed["name"].tolist(), ["", ""])
+        self.assertTrue(all(math.isnan(value) for value in parsed["memory"]))
+
+
+class TestReconstructDeltaBatches(unittest.TestCase):
+    def test_applies_deltas_removals_and_keyframes(self):
+        batches = [
+            (1.0, True, ["a", "b"], ([100.0, 200.0], [1.0, 2.0]), []),
+            (2.0, False, ["b"], ([250.0], [2.5]), []),
+            (3.0, False, ["c"], ([10.0], [3.0]), ["a"]),
+            (4.0, False, [], ([], []), []),
+            (5.0, True, ["c"], ([20.0], [3.0]), []),
+        ]
+        self.assertEqual(
+            list(k8s_metrics.reconstruct_delta_batches(batches)),
+            [
+                (1.0, ["a", "b"], [(100.0, 1.0), (200.0, 2.0)]),
+                (2.0, ["a", "b"], [(100.0, 1.0), (250.0, 2.5)]),
+                (3.0, ["b", "c"], [(250.0, 2.5), (10.0, 3.0)]),
+                (4.0, ["b", "c"], [(250.0, 2.5), (10.0, 3.0)]),
+                (5.0, ["c"], [(20.0, 3.0)]),
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import k8s_metrics_api  # noqa: E402
+
+POD_METRICS = {
+    "items": [
+        {
+            "metadata": {"name": "cnmpc-agent-0"},
+            "timestamp": "2024-05-01T12:00:05Z",
+            "containers": [
+                {"usage": {"cpu": "250000000n", "memory": "64Mi"}},
+                {"usage": {"cpu": "5m", "memory": "1000k"}},
+            ],
+        },
+        {
+            "metadata": {"name": "cnmpc-agent-1"},
+            "timestamp": "2024-05-01T12:00:00Z",
+            "containers": [{"usage": {"cpu": "1", "memory": "1Gi"}}],
+        },
+        {
+            "metadata": {"name": "metrics-server"},
+            "timestamp": "2024-05-01T11:00:00Z",
+            "containers": [{"usage": {"cpu": "1m", "memory": "10Mi"}}],
+        },
+    ]
+}
+NODE_METRICS = {
+    "items": [
+        {
+            "metadata": {"name": "node-a"},
+            "timestamp": "2024-05-01T12:00:00Z",
+            "usage": {"cpu": "500m", "memory": "2Gi"},
+        }
+    ]
+}
+NODES = {"items": [{"metadata": {"name": "node-a"}, "status": {"allocatable": {"cpu": "4", "memory": "8Gi"}}}]}
+PODS = {"items": [{"metadata": {"uid": "1234-abcd", "name": "cnmpc-agent-0"}}]}
+
+
+class FakeTransport:
+    """Answers GET requests from a {path: (status, body)} table and records the requested paths"""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.paths = []
+        self.closed = False
+
+    def get(self, path):
+        self.paths.append(path)
+        status, body = self.responses[path]
+        return status, json.dumps(body).encode() if isinstance(body, dict) else body
+
+    def close(self):
+        self.closed = True
+
+
+class TestQuantities(unittest.TestCase):
+    def test_cpu(self):
+        self.assertEqual(k8s_metrics_api.parse_cpu_quantity("250m"), 250.0)
+        self.assertEqual(k8s_metrics_api.parse_cpu_quantity("2"), 2000.0)
+        self.assertAlmostEqual(k8s_metrics_api.parse_cpu_quantity("1500000n"), 1.5)
+
+    def test_memory(self):
+        self.assertEqual(k8s_metrics_api.parse_memory_quantity("64Mi"), 64 * 2**20)
+        self.assertEqual(k8s_metrics_api.parse_memory_quantity("100k"), 100e3)
+        self.assertEqual(k8s_metrics_api.parse_memory_quantity("42"), 42)
+
+
+class TestMetricsApiClient(unittest.TestCase):
+    def client(self, responses):
+        return k8s_metrics_api.MetricsApiClient(FakeTransport(responses), namespace="cnmpc")
+
+    def test_pod_metrics_sums_containers(self):
+        path = "/apis/metrics.k8s.io/v1beta1/namespaces/cnmpc/pods?labelSelector=app%3Dcnmpc"
+        client = self.client({path: (200, POD_METRICS)})
+        pods = client.pod_metrics(label_selector="app=cnmpc", name_prefix="cnmpc-")
+        self.assertEqual(client.transport.paths, [path])
+        self.assertEqual([name for name, _, _ in pods], ["cnmpc-agent-0", "cnmpc-agent-1"])
+        self.assertAlmostEqual(pods[0][1], 255.0)
+        self.assertEqual(pods[0][2], 64 * 2**20 + 1e6)
+        self.assertEqual(pods[1][1:], (1000.0, 2**30))
+        # The sample time only covers the pods that passed the name prefix
+        self.assertEqual(client.pod_sample_time, k8s_metrics_api.parse_timestamp("2024-05-01T12:00:00Z"))
+
+    def test_node_metrics_percentages(self):
+        client = self.client(
+            {"/apis/metrics.k8s.io/v1beta1/nodes": (200, NODE_METRICS), "/api/v1/nodes": (200, NODES)}
+        )
+        self.assertEqual(client.node_metrics(), [("node-a", 500.0, 12.5, 2 * 2**30, 25.0)])
+        client.node_metrics()
+        # Allocatable is only fetched for nodes not seen before
+        self.assertEqual(client.transport.paths.count("/api/v1/nodes"), 1)
+
+    def test_pod_uids(self):
+        client = self.client({"/api/v1/namespaces/cnmpc/pods": (200, PODS)})
+        self.assertEqual(client.pod_uids(), {"1234-abcd": "cnmpc-agent-0"})
+
+    def test_http_error(self):
+        client = self.client({"/apis/metrics.k8s.io/v1beta1/nodes": (503, b"unavailable")})
+        with self.assertRaisesRegex(RuntimeError, "HTTP 503"):
+            client.node_metrics()
+
+    def test_close(self):
+        client = self.client({})
+        client.close()
+        self.assertTrue(client.transport.closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import math
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "plotting"))
+
+import k8s_metrics  # noqa: E402
+
+# The monitor imports rospy and the generated messages, so it needs a sourced catkin workspace
+try:
+    import k8s_resource_metrics
+except ImportError:
+    k8s_resource_metrics = None
+
+UID_A = "0a1b2c3d-0000-1111-2222-333344445555"
+UID_B = "9f8e7d6c-aaaa-bbbb-cccc-ddddeeeeffff"
+UID_C = "12345678-9abc-def0-1234-56789abcdef0"
+
+
+@unittest.skipIf(k8s_resource_metrics is None, "rospy and cnmpc_recording messages are not importable")
+class TestCgroupSampler(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.uids = {UID_A: "cnmpc-agent-0", UID_B: "cnmpc-agent-1", UID_C: "kube-proxy"}
+        self.sampler = k8s_resource_metrics.CgroupSampler(self.root, get_pod_uids=lambda: self.uids)
+
+    def tearDown(self):
+        self.sampler.close()
+        shutil.rmtree(self.root)
+
+    def write_pod(self, pod_dir, usage_usec, nr_throttled=0, throttled_usec=0, memory_bytes=2**20):
+        """Writes the cgroup v2 files the sampler reads into a fake pod directory"""
+        path = os.path.join(self.root, pod_dir)
+        os.makedirs(os.path.join(path, "container"), exist_ok=True)
+        with open(os.path.join(path, "cpu.stat"), "w") as f:
+            f.write(f"usage_usec {usage_usec}\nnr_throttled {nr_throttled}\nthrottled_usec {throttled_usec}\n")
+        with open(os.path.join(path, "memory.current"), "w") as f:
+            f.write(f"{memory_bytes}\n")
+        return path
+
+    def systemd_dir(self, uid):
+        name = f"kubepods-burstable-pod{uid.replace('-', '_')}.slice"
+        return os.path.join("kubepods.slice", "kubepods-burstable.slice", name)
+
+    def sample_at(self, now):
+        # Discovery runs synchronously in the tests, so keep sample from starting it on the worker
+        self.sampler.next_discovery = math.inf
+        with mock.patch.object(k8s_resource_metrics.time, "monotonic", return_value=now):
+            return self.sampler.sample()
+
+    def test_discovers_systemd_and_cgroupfs_layouts(self):
+        systemd = self.write_pod(self.systemd_dir(UID_A), 0)
+        cgroupfs = self.write_pod(os.path.join("kubepods", "besteffort", f"pod{UID_B}"), 0)
+        self.write_pod(self.systemd_dir(UID_C), 0)
+        self.sampler.discover()
+        self.assertEqual(self.sampler.pod_dirs, {"cnmpc-agent-0": systemd, "cnmpc-agent-1": cgroupfs})
+
+    def test_counter_deltas(self):
+        pod_dir = self.systemd_dir(UID_A)
+        self.write_pod(pod_dir, usage_usec=1_000_000, nr_throttled=5, throttled_usec=100)
+        self.sampler.discover()
+        self.assertEqual(self.sample_at(10.0), [])  # The first sample only primes the counters
+
+        self.write_pod(pod_dir, usage_usec=1_250_000, nr_throttled=7, throttled_usec=400, memory_bytes=3 * 2**20)
+        ((name, cpu_millicores, memory_bytes, nr_throttled, throttled_usec),) = self.sample_at(10.5)
+        self.assertEqual(name, "cnmpc-agent-0")
+        self.assertAlmostEqual(cpu_millicores, 500.0)
+        self.assertEqual((memory_bytes, nr_throttled, throttled_usec), (3 * 2**20, 2, 300))
+
+    def test_recreated_pod_starts_new_counters(self):
+        self.write_pod(self.systemd_dir(UID_A), usage_usec=5_000_000, nr_throttled=50)
+        self.sampler.discover()
+        self.sample_at(1.0)
+
+        # Same pod name, new uid and cgroup directory with counters starting from zero
+        shutil.rmtree(os.path.join(self.root, self.systemd_dir(UID_A)))
+        self.uids = {UID_B: "cnmpc-agent-0"}
+        self.write_pod(self.systemd_dir(UID_B), usage_usec=1000, nr_throttled=1)
+        self.sampler.discover()
+        self.assertEqual(self.sample_at(2.0), [])
+
+        self.write_pod(self.systemd_dir(UID_B), usage_usec=101_000, nr_throttled=3)
+        ((_, cpu_millicores, _, nr_throttled, _),) = self.sample_at(3.0)
+        self.assertAlmostEqual(cpu_millicores, 100.0)
+        self.assertEqual(nr_throttled, 2)
+
+    def test_failed_lookup_keeps_pod_names(self):
+        self.write_pod(self.systemd_dir(UID_A), 0)
+        self.sampler.discover()
+        self.uids = None
+        self.sampler.next_discovery = math.inf
+        self.sampler.discover()
+        self.assertEqual(list(self.sampler.pod_dirs), ["cnmpc-agent-0"])
+        # and a new lookup is due within retry_period
+        self.assertLess(self.sampler.next_discovery, math.inf)
+
+    def test_vanished_pod_is_skipped(self):
+        self.write_pod(self.systemd_dir(UID_A), 0)
+        self.sampler.discover()
+        shutil.rmtree(os.path.join(self.root, "kubepods.slice"))
+        self.assertEqual(self.sample_at(1.0), [])
+        self.assertLessEqual(self.sampler.next_discovery, 1.0 + self.sampler.retry_period)
+
+
+@unittest.skipIf(k8s_resource_metrics is None, "rospy and cnmpc_recording messages are not importable")
+class TestDeltaFilter(unittest.TestCase):
+    SCRAPES = [
+        [("a", 100.0, 1.0), ("b", 200.0, 2.0)],
+        [("a", 100.0, 1.0), ("b", 250.0, 2.0)],
+        [("b", 250.0, 2.0), ("c", 10.0, 3.0)],
+        [("b", 250.0, 2.0), ("c", 10.0, 3.0)],
+        [("a", 50.0, 1.0), ("c", 20.0, 3.0)],
+        [],
+        [("c", 20.0, 3.0)],
+    ]
+
+    def filtered(self, keyframe_interval):
+        delta_filter = k8s_resource_metrics.DeltaFilter(keyframe_interval)
+        return [delta_filter.filter(rows) for rows in self.SCRAPES]
+
+    def test_publishes_changes_and_removals(self):
+        filtered = self.filtered(keyframe_interval=4)
+        self.assertEqual([keyframe for _, keyframe, _ in filtered], [True, False, False, False, True, False, False])
+        self.assertEqual(filtered[1][0], [("b", 250.0, 2.0)])
+        self.assertEqual(filtered[2], ([("c", 10.0, 3.0)], False, ["a"]))
+        self.assertEqual(filtered[3], ([], False, []))
+        self.assertEqual(filtered[5], ([], False, ["a", "c"]))
+
+    def test_interval_below_one_sends_keyframes(self):
+        for keyframe_interval in (0, 1, -3):
+            self.assertTrue(all(keyframe for _, keyframe, _ in self.filtered(keyframe_interval)))
+
+    @staticmethod
+    def batch(stamp, rows, keyframe, removed_names):
+        # Laid out like a PodMetrics message: names and one array per value
+        columns = ([row[1] for row in rows], [row[2] for row in rows])
+        return stamp, keyframe, [row[0] for row in rows], columns, removed_names
+
+    def test_round_trip(self):
+        for keyframe_interval in (1, 2, 3, 30):
+            batches = [
+                self.batch(stamp, *filtered) for stamp, filtered in enumerate(self.filtered(keyframe_interval))
+            ]
+            snapshots = [dict(zip(names, rows)) for _, names, rows in k8s_metrics.reconstruct_delta_batches(batches)]
+            self.assertEqual(snapshots, [{row[0]: row[1:] for row in rows} for rows in self.SCRAPES])
+
+
+if __name__ == "__main__":
+    unittest.main()
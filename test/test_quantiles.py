@@ -0,0 +1,110 @@
+import math
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "plotting"))
+
+import quantiles  # noqa: E402
+
+ACCURACY = 0.01
+QS = (0.0, 0.1, 0.5, 0.9, 0.95, 0.99, 0.999, 1.0)
+
+
+def exact_quantile(values, q):
+    # The sketch returns the value of rank q * (n - 1), rounded down
+    return np.sort(values)[int(q * (len(values) - 1))]
+
+
+class TestDDSketch(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.values = rng.lognormal(mean=-3.0, sigma=1.5, size=20000)
+
+    def assertAccurate(self, result, values, qs=QS):
+        for q, value in zip(qs, result):
+            self.assertLessEqual(abs(value - exact_quantile(values, q)), ACCURACY * exact_quantile(values, q) + 1e-12)
+
+    def test_quantiles_within_relative_accuracy(self):
+        self.assertAccurate(quantiles.sketch(self.values, ACCURACY).quantiles(QS), self.values)
+
+    def test_zero_and_negative_values(self):
+        values = np.concatenate([self.values, np.zeros(5000), -self.values[:1000], [np.nan, np.inf]])
+        result = quantiles.sketch(values, ACCURACY)
+        self.assertEqual(result.count, len(values) - 2)
+        self.assertEqual(result.quantile(0.1), 0.0)
+        self.assertAccurate(result.quantiles((0.5, 0.99)), values[np.isfinite(values)].clip(min=0), (0.5, 0.99))
+
+    def test_empty(self):
+        empty = quantiles.DDSketch()
+        self.assertTrue(math.isnan(empty.quantile(0.5)))
+        self.assertTrue(math.isnan(empty.fraction_above(1.0)))
+
+    def test_merge_equals_sketch_of_all_values(self):
+        first, second = self.values[:7000], self.values[7000:]
+        merged = quantiles.sketch(first).merge(quantiles.sketch(second))
+        whole = quantiles.sketch(self.values)
+        self.assertEqual(merged.bins, whole.bins)
+        self.assertEqual((merged.count, merged.min, merged.max), (whole.count, whole.min, whole.max))
+
+    def test_merge_requires_same_accuracy(self):
+        with self.assertRaises(ValueError):
+            quantiles.sketch(self.values, 0.01).merge(quantiles.sketch(self.values, 0.02))
+
+    def test_subtract_restores_counts(self):
+        first = quantiles.sketch(self.values[:7000], max_bins=None)
+        second = quantiles.sketch(np.concatenate([self.values[7000:], np.zeros(10)]), max_bins=None)
+        combined = quantiles.sketch(self.values[:7000], max_bins=None).merge(second).subtract(second)
+        self.assertEqual(combined.bins, first.bins)
+        self.assertEqual((combined.count, combined.zero_count), (first.count, 0))
+        self.assertAlmostEqual(combined.min, first.min, delta=2 * ACCURACY * first.min)
+        self.assertAlmostEqual(combined.max, first.max, delta=2 * ACCURACY * first.max)
+
+        combined.subtract(first)
+        self.assertEqual((combined.count, combined.bins), (0, {}))
+        self.assertEqual((combined.min, combined.max), (math.inf, -math.inf))
+
+    def test_subtract_collapsed_raises(self):
+        collapsed = quantiles.sketch(self.values, max_bins=16)
+        self.assertTrue(collapsed.collapsed)
+        self.assertLessEqual(len(collapsed.bins), 16)
+        with self.assertRaises(ValueError):
+            collapsed.subtract(quantiles.sketch(self.values[:10]))
+
+    def test_collapse_keeps_upper_quantiles(self):
+        # 256 buckets of 2% span a factor of 160, more than from the 0.99 quantile to the maximum
+        collapsed = quantiles.sketch(self.values, max_bins=256)
+        self.assertTrue(collapsed.collapsed)
+        self.assertAccurate(collapsed.quantiles((0.99, 0.999, 1.0)), self.values, (0.99, 0.999, 1.0))
+
+    def test_fraction_above(self):
+        result = quantiles.sketch(self.values)
+        for threshold in (0.001, 0.01, 0.05, 0.2, 1.0):
+            self.assertAlmostEqual(result.fraction_above(threshold), np.mean(self.values > threshold), delta=0.005)
+        self.assertEqual(result.fraction_above(0.0), 1.0)
+
+
+class TestRollingQuantiles(unittest.TestCase):
+    def test_matches_exact_window_quantiles(self):
+        rng = np.random.default_rng(3)
+        times = np.sort(rng.uniform(0.0, 100.0, 5000))
+        values = rng.lognormal(mean=0.0, sigma=2.0, size=len(times))
+        qs = (0.5, 0.95, 0.99)
+        end_times, result = quantiles.rolling_quantiles(times, values, window=10.0, step=1.0, qs=qs)
+
+        steps = np.floor(times - times[0]).astype(int)
+        self.assertEqual(len(end_times), len(np.unique(steps)))
+        for end_time, row in zip(end_times, result):
+            current = int(round(end_time - times[0])) - 1
+            window = values[(steps > current - 10) & (steps <= current)]
+            for q, value in zip(qs, row):
+                self.assertLessEqual(abs(value - exact_quantile(window, q)), ACCURACY * exact_quantile(window, q))
+
+    def test_empty(self):
+        end_times, result = quantiles.rolling_quantiles([], [], qs=(0.5,))
+        self.assertEqual((end_times.shape, result.shape), ((0,), (0, 1)))
+
+
+if __name__ == "__main__":
+    unittest.main()
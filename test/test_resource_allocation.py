@@ -0,0 +1,89 @@
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "plotting"))
+
+from resource_allocation import ResourceSchedule, reconstruct_resources  # noqa: E402
+
+
+def reference_loops(time_r, time_resources, first_hold, second_hold):
+    """The counter loops of control_law_plot.py that reconstruct_resources replaced, with the holds as arguments"""
+    counter = 0
+    counter2 = 0
+    counter3 = 0
+    counter4 = 0
+    time_r = np.array(time_r, dtype=float)
+    time_resources = np.array(time_resources, dtype=float)
+    resources = np.zeros(len(time_resources))
+    for i in range(0, len(time_resources) - 1):
+        if time_r[i] < 4.95:
+            resources[i] = 1500
+            time_resources[i] = 0
+    for i in range(0, len(time_resources) - 1):
+        if time_resources[i] < 3000:
+            resources[i] = 1500
+        elif time_resources[i] >= 3000 and time_resources[i] <= 5000:
+            resources[i] = 3500
+        else:
+            resources[i] = 6000
+    for i in range(0, len(resources) - 1):
+        counter2 = counter2 + 1
+        if resources[i] == 3500:
+            resources[i] = 1500
+            counter = counter + 1
+        if counter > first_hold:
+            break
+    for i in range(counter2, len(resources) - 1):
+        if resources[i] == 3500:
+            counter3 = i + 1
+            resources[i] = time_resources[counter2]
+    for i in range(counter3, len(resources) - 1):
+        counter4 = i + 1
+        if resources[i] == 6000:
+            resources[i] = time_resources[counter2]
+            counter = counter + 1
+        if counter > second_hold:
+            break
+    for i in range(counter4, len(resources) - 1):
+        resources[i] = time_resources[counter4]
+    time_r[len(resources) - 1] = 240
+    resources[len(resources) - 1] = time_resources[counter4]
+    return time_r, time_resources, resources
+
+
+class TestReconstructResources(unittest.TestCase):
+    def assertMatchesLoops(self, time_r, demand, first_hold, second_hold):
+        schedule = ResourceSchedule(first_hold=first_hold, second_hold=second_hold)
+        expected = reference_loops(time_r, demand, first_hold, second_hold)
+        actual = reconstruct_resources(time_r, demand, schedule)
+        for name, values, wanted in zip(("time_r", "time_resources", "resources"), actual, expected):
+            np.testing.assert_array_equal(values, wanted, err_msg=f"{name} with {schedule}")
+
+    def test_matches_loops_on_random_demand(self):
+        rng = np.random.default_rng(5)
+        for trial in range(300):
+            n = int(rng.integers(1, 80))
+            time_r = np.sort(rng.uniform(0.0, 20.0, n))
+            # Demand around the thresholds, with runs so the holds end at different places
+            levels = rng.choice([1000.0, 3000.0, 4200.0, 5000.0, 7000.0], size=n, p=[0.2, 0.1, 0.3, 0.1, 0.3])
+            demand = np.repeat(levels, rng.integers(1, 4, n))[:n] if trial % 2 else levels
+            first_hold = int(rng.integers(0, 15))
+            second_hold = int(rng.integers(0, 30))
+            self.assertMatchesLoops(time_r, demand, first_hold, second_hold)
+
+    def test_matches_loops_with_default_schedule(self):
+        rng = np.random.default_rng(11)
+        time_r = np.linspace(0.0, 230.0, 4000)
+        demand = np.clip(rng.normal(4500.0, 1500.0, len(time_r)), 0.0, None)
+        self.assertMatchesLoops(time_r, demand, 500, 1000)
+        self.assertMatchesLoops(time_r, demand, 800, 900)
+
+    def test_empty(self):
+        time_r, demand, resources = reconstruct_resources([], [])
+        self.assertEqual((len(time_r), len(demand), len(resources)), (0, 0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
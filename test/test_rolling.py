@@ -0,0 +1,74 @@
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "plotting"))
+
+import rolling  # noqa: E402
+import stream  # noqa: E402
+
+
+def stream_hampel(values, **kwargs):
+    return np.array([value for _, _, value in stream.hampel((("/x", t, v) for t, v in enumerate(values)), **kwargs)])
+
+
+class TestHampel(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        self.noise = rng.normal(0.0, 1.0, 5000)
+        self.spikes = np.arange(50, 5000, 97)
+        # Quantized delays: more than half of every window holds the same value
+        self.quantized = np.round(rng.normal(10.0, 0.4, 5000))
+        self.quantized[self.spikes] += 50
+
+    def test_replaces_spikes(self):
+        values = self.noise.copy()
+        values[self.spikes] += 20
+        filtered, outliers = rolling.hampel(values)
+        self.assertTrue(outliers[self.spikes].all())
+        self.assertLess(outliers.mean(), 0.02)
+        self.assertLess(np.abs(filtered[self.spikes]).max(), 3)
+
+    def test_zero_mad_flags_nothing(self):
+        filtered, outliers = rolling.hampel(self.quantized)
+        self.assertFalse(outliers.any())
+        np.testing.assert_array_equal(filtered, self.quantized)
+
+    def test_min_mad_catches_spikes_in_flat_windows(self):
+        filtered, outliers = rolling.hampel(self.quantized, min_mad=1.0)
+        np.testing.assert_array_equal(np.flatnonzero(outliers), self.spikes)
+        np.testing.assert_array_equal(filtered[self.spikes], 10.0)
+
+    def test_stream_matches_offline(self):
+        for values in (self.noise, self.quantized):
+            for window in (1, 2, 101, 1000):
+                for min_mad in (0.0, 1.0):
+                    offline, _ = rolling.hampel(values, window, center=False, min_mad=min_mad)
+                    np.testing.assert_array_equal(stream_hampel(values, window=window, min_mad=min_mad), offline)
+
+
+class TestIndexableSkiplist(unittest.TestCase):
+    def test_matches_sorted_list(self):
+        rng = np.random.default_rng(4)
+        skiplist = stream.IndexableSkiplist(64)
+        expected = []
+        for value in rng.integers(0, 20, 2000).tolist():
+            if expected and rng.random() < 0.45:
+                removed = expected.pop(int(rng.integers(len(expected))))
+                skiplist.remove(removed)
+            else:
+                skiplist.insert(value)
+                expected.append(value)
+            expected.sort()
+            self.assertEqual([skiplist[i] for i in range(len(skiplist))], expected)
+
+    def test_remove_missing_raises(self):
+        skiplist = stream.IndexableSkiplist(8)
+        skiplist.insert(1.0)
+        with self.assertRaises(KeyError):
+            skiplist.remove(2.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
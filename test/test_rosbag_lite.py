@@ -0,0 +1,199 @@
+import bz2
+import os
+import struct
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "plotting"))
+
+import rosbag_lite  # noqa: E402
+
+CONNECTIONS = {
+    0: ("/solver_time", "std_msgs/Float64", "float64 data\n"),
+    1: ("/uplink_delay", "std_msgs/Header", "uint32 seq\ntime stamp\nstring frame_id\n"),
+    2: ("/k8s_pod_metrics", "std_msgs/String", "string data\n"),
+}
+
+
+def header_bytes(fields):
+    out = b""
+    for name, value in fields.items():
+        field = name.encode() + b"=" + value
+        out += struct.pack("<I", len(field)) + field
+    return out
+
+
+def record(fields, data):
+    header = header_bytes(fields)
+    return struct.pack("<I", len(header)) + header + struct.pack("<I", len(data)) + data
+
+
+def pack_time(t):
+    secs = int(t)
+    return struct.pack("<II", secs, int(round((t - secs) * 1e9)))
+
+
+def pack_string(text):
+    return struct.pack("<I", len(text)) + text.encode()
+
+
+def serialize(conn_id, value):
+    if conn_id == 0:
+        return struct.pack("<d", value)
+    if conn_id == 1:
+        return struct.pack("<I", 0) + pack_time(value) + pack_string("")
+    return pack_string(value)
+
+
+def connection_record(conn_id):
+    topic, msg_type, definition = CONNECTIONS[conn_id]
+    return record(
+        {"op": b"\x07", "conn": struct.pack("<I", conn_id), "topic": topic.encode()},
+        header_bytes(
+            {
+                "topic": topic.encode(),
+                "type": msg_type.encode(),
+                "md5sum": b"0" * 32,
+                "message_definition": definition.encode(),
+            }
+        ),
+    )
+
+
+def compress(compression, data):
+    if compression == "bz2":
+        return bz2.compress(data)
+    if compression == "lz4":
+        return rosbag_lite.lz4_frame.compress(data)
+    return data
+
+
+def write_bag(path, chunks):
+    """Writes a rosbag v2.0 file of chunks given as (compression, [(conn_id, time, value)])"""
+    bag_header_length = 4096
+    body = b""
+    chunk_infos = []
+    position = len(rosbag_lite.BAG_MAGIC) + bag_header_length
+    for compression, messages in chunks:
+        data = b"".join(connection_record(conn_id) for conn_id in sorted({m[0] for m in messages}))
+        index = {}
+        for conn_id, t, value in messages:
+            index.setdefault(conn_id, []).append(pack_time(t) + struct.pack("<I", len(data)))
+            data += record({"op": b"\x02", "conn": struct.pack("<I", conn_id), "time": pack_time(t)}, serialize(conn_id, value))
+        chunk = record(
+            {"op": b"\x05", "compression": compression.encode(), "size": struct.pack("<I", len(data))},
+            compress(compression, data),
+        )
+        for conn_id, entries in index.items():
+            chunk += record(
+                {
+                    "op": b"\x04",
+                    "ver": struct.pack("<I", 1),
+                    "conn": struct.pack("<I", conn_id),
+                    "count": struct.pack("<I", len(entries)),
+                },
+                b"".join(entries),
+            )
+        times = [t for _, t, _ in messages]
+        chunk_infos.append((position, min(times), max(times), {c: len(e) for c, e in index.items()}))
+        body += chunk
+        position += len(chunk)
+
+    index_section = b"".join(connection_record(conn_id) for conn_id in CONNECTIONS)
+    for chunk_position, start, end, counts in chunk_infos:
+        index_section += record(
+            {
+                "op": b"\x06",
+                "ver": struct.pack("<I", 1),
+                "chunk_pos": struct.pack("<Q", chunk_position),
+                "start_time": pack_time(start),
+                "end_time": pack_time(end),
+                "count": struct.pack("<I", len(counts)),
+            },
+            b"".join(struct.pack("<II", conn_id, count) for conn_id, count in counts.items()),
+        )
+
+    header = header_bytes(
+        {
+            "op": b"\x03",
+            "index_pos": struct.pack("<Q", position),
+            "conn_count": struct.pack("<i", len(CONNECTIONS)),
+            "chunk_count": struct.pack("<i", len(chunks)),
+        }
+    )
+    padding = bag_header_length - 8 - len(header)
+    with open(path, "wb") as f:
+        f.write(rosbag_lite.BAG_MAGIC)
+        f.write(struct.pack("<I", len(header)) + header + struct.pack("<I", padding) + b" " * padding)
+        f.write(body + index_section)
+
+
+def message_value(conn_id, columns):
+    if conn_id == 1:
+        return columns["stamp.secs"] + columns["stamp.nsecs"] * 1e-9
+    return columns["data"]
+
+
+class TestRosbagLite(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "test.bag")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read(self, chunks, **kwargs):
+        write_bag(self.path, chunks)
+        topics = {topic: conn_id for conn_id, (topic, _, _) in CONNECTIONS.items()}
+        with rosbag_lite.Bag(self.path, workers=2) as bag:
+            return [
+                (topic, round(t, 6), message_value(topics[topic], columns))
+                for topic, columns, t in bag.read_messages(**kwargs)
+            ]
+
+    @staticmethod
+    def expected(chunks, start=0.0, end=float("inf")):
+        messages = sorted((t, conn_id, value) for _, chunk in chunks for conn_id, t, value in chunk)
+        return [
+            (CONNECTIONS[conn_id][0], round(t, 6), value) for t, conn_id, value in messages if start <= t <= end
+        ]
+
+    def compressions(self):
+        return ["none", "bz2"] + (["lz4"] if rosbag_lite.lz4_frame is not None else [])
+
+    def test_reads_every_compression(self):
+        chunks = []
+        for index, compression in enumerate(self.compressions()):
+            t0 = 100.0 + 10 * index
+            messages = []
+            for k in range(5):
+                messages.append((0, t0 + k, 1.5 * k + index))
+                messages.append((1, t0 + k + 0.25, t0 + k - 0.05))
+                messages.append((2, t0 + k + 0.5, f"cnmpc-{index}: CPU={k}m, Memory=1Mi"))
+            chunks.append((compression, messages))
+        self.assertEqual(self.read(chunks), self.expected(chunks))
+
+    def test_merges_overlapping_chunks_by_time(self):
+        chunks = [
+            ("bz2", [(0, 100.0 + k, float(k)) for k in range(0, 10, 2)]),
+            ("none", [(0, 100.0 + k, float(k)) for k in range(1, 10, 2)] + [(2, 100.5, "late")]),
+        ]
+        messages = self.read(chunks)
+        self.assertEqual(messages, self.expected(chunks))
+        self.assertEqual([t for _, t, _ in messages], sorted(t for _, t, _ in messages))
+
+    def test_time_window_and_topics(self):
+        chunks = [("bz2", [(conn_id, 100.0 + k + 0.1 * conn_id, float(k)) for k in range(10) for conn_id in (0, 1)])]
+        messages = self.read(chunks, topics=["/solver_time"], start_time=103.0, end_time=106.0)
+        self.assertEqual(messages, [m for m in self.expected(chunks, 103.0, 106.0) if m[0] == "/solver_time"])
+
+    def test_field_projection(self):
+        write_bag(self.path, [("none", [(1, 100.0, 99.5)])])
+        with rosbag_lite.Bag(self.path) as bag:
+            ((_, columns, _),) = bag.read_messages(fields={"/uplink_delay": ["stamp.nsecs"]})
+        self.assertEqual(columns, {"stamp.nsecs": 500000000})
+
+
+if __name__ == "__main__":
+    unittest.main()